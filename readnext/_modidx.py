@@ -7,44 +7,316 @@ d = { 'settings': { 'branch': 'main',
                 'lib_path': 'readnext'},
   'syms': { 'readnext.arxiv_categories': { 'readnext.arxiv_categories.exists': ( 'arxiv_categories.html#exists',
                                                                                  'readnext/arxiv_categories.py')},
-            'readnext.arxiv_sync': { 'readnext.arxiv_sync.delete_broken_pdf': ( 'arxiv_sync.html#delete_broken_pdf',
+            'readnext.arxiv_sync': { 'readnext.arxiv_sync.RetryableDownloadError': ( 'arxiv_sync.html#retryabledownloaderror',
+                                                                                     'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.RetryableDownloadError.__init__': ( 'arxiv_sync.html#retryabledownloaderror.__init__',
+                                                                                              'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.TokenBucket': ('arxiv_sync.html#tokenbucket', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.TokenBucket.__init__': ( 'arxiv_sync.html#tokenbucket.__init__',
+                                                                                   'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.TokenBucket.acquire': ( 'arxiv_sync.html#tokenbucket.acquire',
+                                                                                  'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.delete_broken_pdf': ( 'arxiv_sync.html#delete_broken_pdf',
                                                                                 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.download_concurrency': ( 'arxiv_sync.html#download_concurrency',
+                                                                                   'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.download_file': ('arxiv_sync.html#download_file', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.download_files': ('arxiv_sync.html#download_files', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.download_pdfs': ('arxiv_sync.html#download_pdfs', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.download_rate': ('arxiv_sync.html#download_rate', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.download_retries': ('arxiv_sync.html#download_retries', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.get_arxiv_abstract': ( 'arxiv_sync.html#get_arxiv_abstract',
+                                                                                 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.get_arxiv_abstracts': ( 'arxiv_sync.html#get_arxiv_abstracts',
+                                                                                  'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.get_arxiv_entries': ( 'arxiv_sync.html#get_arxiv_entries',
+                                                                                'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.get_arxiv_metadata': ( 'arxiv_sync.html#get_arxiv_metadata',
+                                                                                 'readnext/arxiv_sync.py'),
                                      'readnext.arxiv_sync.get_arxiv_pdfs_url': ( 'arxiv_sync.html#get_arxiv_pdfs_url',
                                                                                  'readnext/arxiv_sync.py'),
-                                     'readnext.arxiv_sync.get_docs_path': ('arxiv_sync.html#get_docs_path', 'readnext/arxiv_sync.py'),
-                                     'readnext.arxiv_sync.sync_arxiv': ('arxiv_sync.html#sync_arxiv', 'readnext/arxiv_sync.py')},
-            'readnext.embedding': { 'readnext.embedding.download_embedding_model': ( 'embedding.html#download_embedding_model',
-                                                                                     'readnext/embedding.py'),
-                                    'readnext.embedding.embed_category_papers': ( 'embedding.html#embed_category_papers',
+                                     'readnext.arxiv_sync.get_local_pdf': ('arxiv_sync.html#get_local_pdf', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.get_paper_id': ('arxiv_sync.html#get_paper_id', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.get_store_path': ('arxiv_sync.html#get_store_path', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.is_valid_pdf': ('arxiv_sync.html#is_valid_pdf', 'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.parse_arxiv_entry': ( 'arxiv_sync.html#parse_arxiv_entry',
+                                                                                'readnext/arxiv_sync.py'),
+                                     'readnext.arxiv_sync.sync_arxiv_categories': ( 'arxiv_sync.html#sync_arxiv_categories',
+                                                                                    'readnext/arxiv_sync.py')},
+            'readnext.benchmark': { 'readnext.benchmark.ArxivStandIn': ('benchmark.html#arxivstandin', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.ArxivStandIn.do_GET': ( 'benchmark.html#arxivstandin.do_get',
+                                                                                'readnext/benchmark.py'),
+                                    'readnext.benchmark.ArxivStandIn.log_message': ( 'benchmark.html#arxivstandin.log_message',
+                                                                                     'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub': ('benchmark.html#zoterostub', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.__init__': ( 'benchmark.html#zoterostub.__init__',
+                                                                                'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.attachment_both': ( 'benchmark.html#zoterostub.attachment_both',
+                                                                                       'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.check_items': ( 'benchmark.html#zoterostub.check_items',
+                                                                                   'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.collection_items_top': ( 'benchmark.html#zoterostub.collection_items_top',
+                                                                                            'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.collections': ( 'benchmark.html#zoterostub.collections',
+                                                                                   'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.create_items': ( 'benchmark.html#zoterostub.create_items',
+                                                                                    'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.everything': ( 'benchmark.html#zoterostub.everything',
+                                                                                  'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.item_template': ( 'benchmark.html#zoterostub.item_template',
+                                                                                     'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.last_modified_version': ( 'benchmark.html#zoterostub.last_modified_version',
+                                                                                             'readnext/benchmark.py'),
+                                    'readnext.benchmark.ZoteroStub.request': ('benchmark.html#zoterostub.request', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.arxiv_stand_in': ('benchmark.html#arxiv_stand_in', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.compare_benchmarks': ('benchmark.html#compare_benchmarks', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.environment': ('benchmark.html#environment', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.git_commit': ('benchmark.html#git_commit', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.make_corpus': ('benchmark.html#make_corpus', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.make_feed': ('benchmark.html#make_feed', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.make_pdf': ('benchmark.html#make_pdf', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.replaced': ('benchmark.html#replaced', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.run_benchmark': ('benchmark.html#run_benchmark', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.run_benchmarks': ('benchmark.html#run_benchmarks', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.stage_result': ('benchmark.html#stage_result', 'readnext/benchmark.py'),
+                                    'readnext.benchmark.timed_calls': ('benchmark.html#timed_calls', 'readnext/benchmark.py')},
+            'readnext.cache': { 'readnext.cache.cache_delete': ('cache.html#cache_delete', 'readnext/cache.py'),
+                                'readnext.cache.cache_expire': ('cache.html#cache_expire', 'readnext/cache.py'),
+                                'readnext.cache.cache_get': ('cache.html#cache_get', 'readnext/cache.py'),
+                                'readnext.cache.cache_set': ('cache.html#cache_set', 'readnext/cache.py'),
+                                'readnext.cache.cache_transaction': ('cache.html#cache_transaction', 'readnext/cache.py'),
+                                'readnext.cache.get_cache_db': ('cache.html#get_cache_db', 'readnext/cache.py'),
+                                'readnext.cache.get_cache_path': ('cache.html#get_cache_path', 'readnext/cache.py')},
+            'readnext.embedding': { 'readnext.embedding.OnnxEmbeddingModel': ('embedding.html#onnxembeddingmodel', 'readnext/embedding.py'),
+                                    'readnext.embedding.OnnxEmbeddingModel.__call__': ( 'embedding.html#onnxembeddingmodel.__call__',
+                                                                                        'readnext/embedding.py'),
+                                    'readnext.embedding.OnnxEmbeddingModel.__init__': ( 'embedding.html#onnxembeddingmodel.__init__',
+                                                                                        'readnext/embedding.py'),
+                                    'readnext.embedding._raise_timeout': ('embedding.html#_raise_timeout', 'readnext/embedding.py'),
+                                    'readnext.embedding.abstract_metadata': ('embedding.html#abstract_metadata', 'readnext/embedding.py'),
+                                    'readnext.embedding.add_papers_categories': ( 'embedding.html#add_papers_categories',
                                                                                   'readnext/embedding.py'),
+                                    'readnext.embedding.benchmark_inference': ( 'embedding.html#benchmark_inference',
+                                                                                'readnext/embedding.py'),
+                                    'readnext.embedding.cached_pdf_to_text': ('embedding.html#cached_pdf_to_text', 'readnext/embedding.py'),
+                                    'readnext.embedding.categories_where': ('embedding.html#categories_where', 'readnext/embedding.py'),
+                                    'readnext.embedding.category_flag': ('embedding.html#category_flag', 'readnext/embedding.py'),
+                                    'readnext.embedding.chroma_documents': ('embedding.html#chroma_documents', 'readnext/embedding.py'),
+                                    'readnext.embedding.chroma_store_text': ('embedding.html#chroma_store_text', 'readnext/embedding.py'),
+                                    'readnext.embedding.chunk_token_windows': ( 'embedding.html#chunk_token_windows',
+                                                                                'readnext/embedding.py'),
+                                    'readnext.embedding.cohere_client': ('embedding.html#cohere_client', 'readnext/embedding.py'),
+                                    'readnext.embedding.cohere_concurrency': ('embedding.html#cohere_concurrency', 'readnext/embedding.py'),
+                                    'readnext.embedding.cohere_embed': ('embedding.html#cohere_embed', 'readnext/embedding.py'),
+                                    'readnext.embedding.cohere_request': ('embedding.html#cohere_request', 'readnext/embedding.py'),
+                                    'readnext.embedding.cohere_retries': ('embedding.html#cohere_retries', 'readnext/embedding.py'),
+                                    'readnext.embedding.download_embedding_model': ( 'embedding.html#download_embedding_model',
+                                                                                     'readnext/embedding.py'),
+                                    'readnext.embedding.embed_category_abstracts': ( 'embedding.html#embed_category_abstracts',
+                                                                                     'readnext/embedding.py'),
+                                    'readnext.embedding.embed_papers': ('embedding.html#embed_papers', 'readnext/embedding.py'),
                                     'readnext.embedding.embed_text': ('embedding.html#embed_text', 'readnext/embedding.py'),
+                                    'readnext.embedding.embed_text_chunks': ('embedding.html#embed_text_chunks', 'readnext/embedding.py'),
+                                    'readnext.embedding.embed_texts': ('embedding.html#embed_texts', 'readnext/embedding.py'),
+                                    'readnext.embedding.embed_texts_chunks': ('embedding.html#embed_texts_chunks', 'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_backend': ('embedding.html#embedding_backend', 'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_batch_size': ( 'embedding.html#embedding_batch_size',
+                                                                                 'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_chunk_overlap': ( 'embedding.html#embedding_chunk_overlap',
+                                                                                    'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_chunking': ('embedding.html#embedding_chunking', 'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_device': ('embedding.html#embedding_device', 'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_pooling': ('embedding.html#embedding_pooling', 'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_pooling_k': ( 'embedding.html#embedding_pooling_k',
+                                                                                'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_precision': ( 'embedding.html#embedding_precision',
+                                                                                'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_store_chunks': ( 'embedding.html#embedding_store_chunks',
+                                                                                   'readnext/embedding.py'),
                                     'readnext.embedding.embedding_system': ('embedding.html#embedding_system', 'readnext/embedding.py'),
+                                    'readnext.embedding.embedding_threads': ('embedding.html#embedding_threads', 'readnext/embedding.py'),
+                                    'readnext.embedding.export_onnx_model': ('embedding.html#export_onnx_model', 'readnext/embedding.py'),
+                                    'readnext.embedding.extract_pdfs_text': ('embedding.html#extract_pdfs_text', 'readnext/embedding.py'),
+                                    'readnext.embedding.file_sha256': ('embedding.html#file_sha256', 'readnext/embedding.py'),
+                                    'readnext.embedding.get_abstract_ids': ('embedding.html#get_abstract_ids', 'readnext/embedding.py'),
+                                    'readnext.embedding.get_cohere_client': ('embedding.html#get_cohere_client', 'readnext/embedding.py'),
                                     'readnext.embedding.get_embeddings': ('embedding.html#get_embeddings', 'readnext/embedding.py'),
+                                    'readnext.embedding.get_embeddings_and_chunks': ( 'embedding.html#get_embeddings_and_chunks',
+                                                                                      'readnext/embedding.py'),
+                                    'readnext.embedding.get_embeddings_batch': ( 'embedding.html#get_embeddings_batch',
+                                                                                 'readnext/embedding.py'),
+                                    'readnext.embedding.get_existing_ids': ('embedding.html#get_existing_ids', 'readnext/embedding.py'),
+                                    'readnext.embedding.get_new_pdfs': ('embedding.html#get_new_pdfs', 'readnext/embedding.py'),
+                                    'readnext.embedding.get_paper_text': ('embedding.html#get_paper_text', 'readnext/embedding.py'),
                                     'readnext.embedding.get_pdfs_from_folder': ( 'embedding.html#get_pdfs_from_folder',
                                                                                  'readnext/embedding.py'),
+                                    'readnext.embedding.load_configured_embedding_model': ( 'embedding.html#load_configured_embedding_model',
+                                                                                            'readnext/embedding.py'),
                                     'readnext.embedding.load_embedding_model': ( 'embedding.html#load_embedding_model',
                                                                                  'readnext/embedding.py'),
-                                    'readnext.embedding.pdf_to_text': ('embedding.html#pdf_to_text', 'readnext/embedding.py')},
+                                    'readnext.embedding.migrate_category_collections': ( 'embedding.html#migrate_category_collections',
+                                                                                         'readnext/embedding.py'),
+                                    'readnext.embedding.papers_metadata': ('embedding.html#papers_metadata', 'readnext/embedding.py'),
+                                    'readnext.embedding.pdf_extract_timeout': ( 'embedding.html#pdf_extract_timeout',
+                                                                                'readnext/embedding.py'),
+                                    'readnext.embedding.pdf_max_pages': ('embedding.html#pdf_max_pages', 'readnext/embedding.py'),
+                                    'readnext.embedding.pdf_to_text': ('embedding.html#pdf_to_text', 'readnext/embedding.py'),
+                                    'readnext.embedding.pdf_to_text_with_timeout': ( 'embedding.html#pdf_to_text_with_timeout',
+                                                                                     'readnext/embedding.py'),
+                                    'readnext.embedding.pool_embeddings': ('embedding.html#pool_embeddings', 'readnext/embedding.py'),
+                                    'readnext.embedding.text_cache_key': ('embedding.html#text_cache_key', 'readnext/embedding.py')},
             'readnext.main': { 'readnext.main.arxiv_sub_categories': ('main.html#arxiv_sub_categories', 'readnext/main.py'),
                                'readnext.main.arxiv_top_categories': ('main.html#arxiv_top_categories', 'readnext/main.py'),
+                               'readnext.main.benchmark': ('main.html#benchmark', 'readnext/main.py'),
+                               'readnext.main.callback': ('main.html#callback', 'readnext/main.py'),
+                               'readnext.main.check_config': ('main.html#check_config', 'readnext/main.py'),
                                'readnext.main.config': ('main.html#config', 'readnext/main.py'),
                                'readnext.main.config_check_one_exists': ('main.html#config_check_one_exists', 'readnext/main.py'),
                                'readnext.main.config_exists': ('main.html#config_exists', 'readnext/main.py'),
+                               'readnext.main.gc': ('main.html#gc', 'readnext/main.py'),
                                'readnext.main.get_embeddings_dimensions': ('main.html#get_embeddings_dimensions', 'readnext/main.py'),
+                               'readnext.main.index': ('main.html#index', 'readnext/main.py'),
                                'readnext.main.init': ('main.html#init', 'readnext/main.py'),
                                'readnext.main.personalized_papers': ('main.html#personalized_papers', 'readnext/main.py'),
+                               'readnext.main.serve': ('main.html#serve', 'readnext/main.py'),
+                               'readnext.main.sync': ('main.html#sync', 'readnext/main.py'),
                                'readnext.main.version': ('main.html#version', 'readnext/main.py')},
-            'readnext.personalize': { 'readnext.personalize.check_already_in_zotero_proposals': ( 'personalize.html#check_already_in_zotero_proposals',
-                                                                                                  'readnext/personalize.py'),
-                                      'readnext.personalize.create_interests_corpus': ( 'personalize.html#create_interests_corpus',
-                                                                                        'readnext/personalize.py'),
+            'readnext.manifest': { 'readnext.manifest.add_paper_categories': ('manifest.html#add_paper_categories', 'readnext/manifest.py'),
+                                   'readnext.manifest.add_tombstones': ('manifest.html#add_tombstones', 'readnext/manifest.py'),
+                                   'readnext.manifest.clear_embedded_ids': ('manifest.html#clear_embedded_ids', 'readnext/manifest.py'),
+                                   'readnext.manifest.clear_tombstones': ('manifest.html#clear_tombstones', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_embedded_before': ('manifest.html#get_embedded_before', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_embedded_ids': ('manifest.html#get_embedded_ids', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_kept_papers': ('manifest.html#get_kept_papers', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_manifest_db': ('manifest.html#get_manifest_db', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_manifest_path': ('manifest.html#get_manifest_path', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_paper_categories': ('manifest.html#get_paper_categories', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_tombstones': ('manifest.html#get_tombstones', 'readnext/manifest.py'),
+                                   'readnext.manifest.get_validated_files': ('manifest.html#get_validated_files', 'readnext/manifest.py'),
+                                   'readnext.manifest.keep_papers': ('manifest.html#keep_papers', 'readnext/manifest.py'),
+                                   'readnext.manifest.manifest_key': ('manifest.html#manifest_key', 'readnext/manifest.py'),
+                                   'readnext.manifest.manifest_transaction': ('manifest.html#manifest_transaction', 'readnext/manifest.py'),
+                                   'readnext.manifest.remove_embedded_ids': ('manifest.html#remove_embedded_ids', 'readnext/manifest.py'),
+                                   'readnext.manifest.remove_file_validation': ( 'manifest.html#remove_file_validation',
+                                                                                 'readnext/manifest.py'),
+                                   'readnext.manifest.set_embedded_ids': ('manifest.html#set_embedded_ids', 'readnext/manifest.py'),
+                                   'readnext.manifest.set_file_validation': ('manifest.html#set_file_validation', 'readnext/manifest.py')},
+            'readnext.personalize': { 'readnext.personalize.artifacts_concurrency': ( 'personalize.html#artifacts_concurrency',
+                                                                                      'readnext/personalize.py'),
+                                      'readnext.personalize.artifacts_executor': ( 'personalize.html#artifacts_executor',
+                                                                                   'readnext/personalize.py'),
+                                      'readnext.personalize.artifacts_timeout': ( 'personalize.html#artifacts_timeout',
+                                                                                  'readnext/personalize.py'),
+                                      'readnext.personalize.chunks_scores': ('personalize.html#chunks_scores', 'readnext/personalize.py'),
                                       'readnext.personalize.get_collection_id_from_name': ( 'personalize.html#get_collection_id_from_name',
                                                                                             'readnext/personalize.py'),
+                                      'readnext.personalize.get_collection_item_versions': ( 'personalize.html#get_collection_item_versions',
+                                                                                             'readnext/personalize.py'),
+                                      'readnext.personalize.get_collection_titles': ( 'personalize.html#get_collection_titles',
+                                                                                      'readnext/personalize.py'),
+                                      'readnext.personalize.get_collections_index': ( 'personalize.html#get_collections_index',
+                                                                                      'readnext/personalize.py'),
+                                      'readnext.personalize.get_interest_text': ( 'personalize.html#get_interest_text',
+                                                                                  'readnext/personalize.py'),
+                                      'readnext.personalize.get_interests_embeddings': ( 'personalize.html#get_interests_embeddings',
+                                                                                         'readnext/personalize.py'),
+                                      'readnext.personalize.get_paper_pdf': ('personalize.html#get_paper_pdf', 'readnext/personalize.py'),
+                                      'readnext.personalize.get_paper_summary': ( 'personalize.html#get_paper_summary',
+                                                                                  'readnext/personalize.py'),
                                       'readnext.personalize.get_pdf_summary': ( 'personalize.html#get_pdf_summary',
                                                                                 'readnext/personalize.py'),
                                       'readnext.personalize.get_personalized_papers': ( 'personalize.html#get_personalized_papers',
                                                                                         'readnext/personalize.py'),
                                       'readnext.personalize.get_target_collection_items': ( 'personalize.html#get_target_collection_items',
                                                                                             'readnext/personalize.py'),
+                                      'readnext.personalize.get_zotero_client': ( 'personalize.html#get_zotero_client',
+                                                                                  'readnext/personalize.py'),
+                                      'readnext.personalize.interests_aggregation': ( 'personalize.html#interests_aggregation',
+                                                                                      'readnext/personalize.py'),
+                                      'readnext.personalize.interests_top_k': ( 'personalize.html#interests_top_k',
+                                                                                'readnext/personalize.py'),
+                                      'readnext.personalize.save_paper_artifacts': ( 'personalize.html#save_paper_artifacts',
+                                                                                     'readnext/personalize.py'),
+                                      'readnext.personalize.save_papers_artifacts': ( 'personalize.html#save_papers_artifacts',
+                                                                                      'readnext/personalize.py'),
                                       'readnext.personalize.save_personalized_papers_in_zotero': ( 'personalize.html#save_personalized_papers_in_zotero',
-                                                                                                   'readnext/personalize.py')}}}
+                                                                                                   'readnext/personalize.py'),
+                                      'readnext.personalize.score_papers': ('personalize.html#score_papers', 'readnext/personalize.py'),
+                                      'readnext.personalize.zotero_client': ('personalize.html#zotero_client', 'readnext/personalize.py')},
+            'readnext.retention': { 'readnext.retention.chroma_connection': ('retention.html#chroma_connection', 'readnext/retention.py'),
+                                    'readnext.retention.compact_store': ('retention.html#compact_store', 'readnext/retention.py'),
+                                    'readnext.retention.delete_papers_embeddings': ( 'retention.html#delete_papers_embeddings',
+                                                                                     'readnext/retention.py'),
+                                    'readnext.retention.gc_auto': ('retention.html#gc_auto', 'readnext/retention.py'),
+                                    'readnext.retention.gc_compact_ratio': ('retention.html#gc_compact_ratio', 'readnext/retention.py'),
+                                    'readnext.retention.gc_keep_recommended': ( 'retention.html#gc_keep_recommended',
+                                                                                'readnext/retention.py'),
+                                    'readnext.retention.gc_max_age_days': ('retention.html#gc_max_age_days', 'readnext/retention.py'),
+                                    'readnext.retention.gc_max_bytes': ('retention.html#gc_max_bytes', 'readnext/retention.py'),
+                                    'readnext.retention.gc_papers': ('retention.html#gc_papers', 'readnext/retention.py'),
+                                    'readnext.retention.get_local_papers': ('retention.html#get_local_papers', 'readnext/retention.py'),
+                                    'readnext.retention.parse_bytes': ('retention.html#parse_bytes', 'readnext/retention.py'),
+                                    'readnext.retention.select_expired_papers': ( 'retention.html#select_expired_papers',
+                                                                                  'readnext/retention.py'),
+                                    'readnext.retention.vacuum': ('retention.html#vacuum', 'readnext/retention.py')},
+            'readnext.retry': {'readnext.retry.retry_after_seconds': ('retry.html#retry_after_seconds', 'readnext/retry.py')},
+            'readnext.server': { 'readnext.server.CommandHandler': ('server.html#commandhandler', 'readnext/server.py'),
+                                 'readnext.server.CommandHandler.do_GET': ('server.html#commandhandler.do_get', 'readnext/server.py'),
+                                 'readnext.server.CommandHandler.do_POST': ('server.html#commandhandler.do_post', 'readnext/server.py'),
+                                 'readnext.server.CommandHandler.send_json': ('server.html#commandhandler.send_json', 'readnext/server.py'),
+                                 'readnext.server.StreamWriter': ('server.html#streamwriter', 'readnext/server.py'),
+                                 'readnext.server.StreamWriter.__init__': ('server.html#streamwriter.__init__', 'readnext/server.py'),
+                                 'readnext.server.StreamWriter.writable': ('server.html#streamwriter.writable', 'readnext/server.py'),
+                                 'readnext.server.StreamWriter.write': ('server.html#streamwriter.write', 'readnext/server.py'),
+                                 'readnext.server.config_fingerprint': ('server.html#config_fingerprint', 'readnext/server.py'),
+                                 'readnext.server.forward': ('server.html#forward', 'readnext/server.py'),
+                                 'readnext.server.make_server': ('server.html#make_server', 'readnext/server.py'),
+                                 'readnext.server.run_server': ('server.html#run_server', 'readnext/server.py'),
+                                 'readnext.server.server_forward': ('server.html#server_forward', 'readnext/server.py'),
+                                 'readnext.server.server_host': ('server.html#server_host', 'readnext/server.py'),
+                                 'readnext.server.server_port': ('server.html#server_port', 'readnext/server.py'),
+                                 'readnext.server.server_running': ('server.html#server_running', 'readnext/server.py'),
+                                 'readnext.server.server_url': ('server.html#server_url', 'readnext/server.py'),
+                                 'readnext.server.warm_up': ('server.html#warm_up', 'readnext/server.py')},
+            'readnext.tracing': { 'readnext.tracing.Span': ('tracing.html#span', 'readnext/tracing.py'),
+                                  'readnext.tracing.Span.__enter__': ('tracing.html#span.__enter__', 'readnext/tracing.py'),
+                                  'readnext.tracing.Span.__exit__': ('tracing.html#span.__exit__', 'readnext/tracing.py'),
+                                  'readnext.tracing.Span.__init__': ('tracing.html#span.__init__', 'readnext/tracing.py'),
+                                  'readnext.tracing.Tracer': ('tracing.html#tracer', 'readnext/tracing.py'),
+                                  'readnext.tracing.Tracer.__init__': ('tracing.html#tracer.__init__', 'readnext/tracing.py'),
+                                  'readnext.tracing.Tracer.count': ('tracing.html#tracer.count', 'readnext/tracing.py'),
+                                  'readnext.tracing.Tracer.record': ('tracing.html#tracer.record', 'readnext/tracing.py'),
+                                  'readnext.tracing.Tracer.spans': ('tracing.html#tracer.spans', 'readnext/tracing.py'),
+                                  'readnext.tracing.Tracer.timestamp': ('tracing.html#tracer.timestamp', 'readnext/tracing.py'),
+                                  'readnext.tracing.count': ('tracing.html#count', 'readnext/tracing.py'),
+                                  'readnext.tracing.current_tid': ('tracing.html#current_tid', 'readnext/tracing.py'),
+                                  'readnext.tracing.instrument': ('tracing.html#instrument', 'readnext/tracing.py'),
+                                  'readnext.tracing.instrument_clients': ('tracing.html#instrument_clients', 'readnext/tracing.py'),
+                                  'readnext.tracing.peak_rss_mb': ('tracing.html#peak_rss_mb', 'readnext/tracing.py'),
+                                  'readnext.tracing.print_summary': ('tracing.html#print_summary', 'readnext/tracing.py'),
+                                  'readnext.tracing.span': ('tracing.html#span', 'readnext/tracing.py'),
+                                  'readnext.tracing.start_tracing': ('tracing.html#start_tracing', 'readnext/tracing.py'),
+                                  'readnext.tracing.stop_tracing': ('tracing.html#stop_tracing', 'readnext/tracing.py'),
+                                  'readnext.tracing.summarize': ('tracing.html#summarize', 'readnext/tracing.py'),
+                                  'readnext.tracing.traced': ('tracing.html#traced', 'readnext/tracing.py'),
+                                  'readnext.tracing.tracing': ('tracing.html#tracing', 'readnext/tracing.py'),
+                                  'readnext.tracing.write_trace': ('tracing.html#write_trace', 'readnext/tracing.py')},
+            'readnext.vector_index': { 'readnext.vector_index.brute_force_neighbours': ( 'vector_index.html#brute_force_neighbours',
+                                                                                         'readnext/vector_index.py'),
+                                       'readnext.vector_index.distances': ('vector_index.html#distances', 'readnext/vector_index.py'),
+                                       'readnext.vector_index.get_chroma_client': ( 'vector_index.html#get_chroma_client',
+                                                                                    'readnext/vector_index.py'),
+                                       'readnext.vector_index.hnsw_metadata': ( 'vector_index.html#hnsw_metadata',
+                                                                                'readnext/vector_index.py'),
+                                       'readnext.vector_index.index_parameters': ( 'vector_index.html#index_parameters',
+                                                                                   'readnext/vector_index.py'),
+                                       'readnext.vector_index.index_recall': ('vector_index.html#index_recall', 'readnext/vector_index.py'),
+                                       'readnext.vector_index.index_stats': ('vector_index.html#index_stats', 'readnext/vector_index.py'),
+                                       'readnext.vector_index.open_collection': ( 'vector_index.html#open_collection',
+                                                                                  'readnext/vector_index.py'),
+                                       'readnext.vector_index.rebuild_collection': ( 'vector_index.html#rebuild_collection',
+                                                                                     'readnext/vector_index.py'),
+                                       'readnext.vector_index.recover_rebuild': ( 'vector_index.html#recover_rebuild',
+                                                                                  'readnext/vector_index.py'),
+                                       'readnext.vector_index.sources_where': ( 'vector_index.html#sources_where',
+                                                                                'readnext/vector_index.py')}}}
@@ -1,104 +1,378 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/02_arxiv_sync.ipynb.
 
 # %% auto 0
-__all__ = ['get_arxiv_pdfs_url', 'get_docs_path', 'delete_broken_pdf', 'sync_arxiv']
+__all__ = ['get_arxiv_entries', 'get_arxiv_pdfs_url', 'get_paper_id', 'parse_arxiv_entry', 'get_arxiv_abstracts',
+           'get_store_path', 'is_valid_pdf', 'delete_broken_pdf', 'download_concurrency', 'download_rate',
+           'download_retries', 'TokenBucket', 'RetryableDownloadError', 'download_file', 'download_files',
+           'download_pdfs', 'sync_arxiv_categories', 'get_arxiv_abstract', 'get_arxiv_metadata', 'get_local_pdf']
 
 # %% ../nbs/02_arxiv_sync.ipynb 6
-import concurrent.futures
+import aiohttp
+import arxiv
+import asyncio
+import base64
 import feedparser
+import hashlib
+import json
 import os
 import re
-import urllib.request
+import time
 from pypdf import PdfReader
 from .arxiv_categories import exists
+from .cache import cache_get, cache_set
+from .manifest import set_file_validation, remove_file_validation, get_validated_files
+from .retry import retry_after_seconds
+from .tracing import traced, count
 from rich import print
 from rich.progress import Progress
 
 # %% ../nbs/02_arxiv_sync.ipynb 8
-def get_arxiv_pdfs_url(category: str) -> list:
-    "Get all the papers refferenced in the daily RSS feed on ArXiv for input 'category'."
+@traced()
+def get_arxiv_entries(category: str) -> list:
+    "Get all the entries of the daily RSS feed on ArXiv for input 'category'."
     if exists(category):
-        feed = feedparser.parse('http://arxiv.org/rss/' + category)
-
-        # get the URL of the PDF file of each paper from the RSS feed
-        return [entry.link for entry in feed.entries]
+        return feedparser.parse('http://arxiv.org/rss/' + category).entries
     else:
         return []
 
+def get_arxiv_pdfs_url(category: str) -> list:
+    "Get all the papers refferenced in the daily RSS feed on ArXiv for input 'category'."
+
+    # get the URL of the PDF file of each paper from the RSS feed
+    return [entry.link for entry in get_arxiv_entries(category)]
+
 # %% ../nbs/02_arxiv_sync.ipynb 10
-def get_docs_path(category: str) -> str:
-    "Generate the proper docs path from a category ID"
-    return os.environ.get('DOCS_PATH').rstrip('/') + '/' + category + '/'
+def get_paper_id(url: str) -> str:
+    "Get the arXiv ID of a paper from its URL"
+    return url.rstrip('/').split('/')[-1]
+
+def parse_arxiv_entry(entry) -> dict:
+    "Get the ID, the title and the abstract of a paper from an entry of the RSS feed."
+    return {'id': get_paper_id(entry.link),
+            'title': re.sub(r'\s*\(arXiv:[^)]*\)\s*$', '', entry.get('title', '')).strip(),
+            'abstract': re.sub(r'<[^>]+>', '', entry.get('summary', '')).strip()}
+
+def get_arxiv_abstracts(category: str) -> list:
+    "Get the ID, the title and the abstract of all the papers of the daily RSS feed on ArXiv for input 'category'."
+    return [parse_arxiv_entry(entry) for entry in get_arxiv_entries(category)]
 
 # %% ../nbs/02_arxiv_sync.ipynb 14
-def delete_broken_pdf(category: str):
-    """Detect and delete broken PDF files.
-       TODO Next iteration needs a better fail over with retry when PDF files are broken from a download.
+def get_store_path() -> str:
+    "Return the path of the papers store, shared by all the categories"
+    return os.environ.get('DOCS_PATH').rstrip('/') + '/papers/'
+
+# %% ../nbs/02_arxiv_sync.ipynb 18
+@traced()
+def is_valid_pdf(file_path: str) -> bool:
+    """Check if `file_path` is a valid PDF file."""
+    try:
+        with open(file_path, 'rb') as pdf_file_obj:
+            # cheap checks of the header, and trailer, of the PDF file
+            if b'%PDF' not in pdf_file_obj.read(1024):
+                return False
+
+            pdf_file_obj.seek(max(os.path.getsize(file_path) - 1024, 0))
+            if b'%%EOF' not in pdf_file_obj.read():
+                return False
+
+            pdf_file_obj.seek(0)
+            PdfReader(pdf_file_obj)
+            return True
+    except Exception:
+        return False
+
+# %% ../nbs/02_arxiv_sync.ipynb 23
+@traced()
+def delete_broken_pdf(docs_path: str = None) -> list:
+    """Detect and delete broken PDF files of `docs_path` (the papers store by default) that haven't been validated yet.
+       Returns the list of the deleted PDF files.
     """
 
-    docs_path = get_docs_path(category)
+    docs_path = docs_path if docs_path is not None else get_store_path()
 
-    # get the list of the PDF files
-    pdf_files = os.listdir(docs_path)
+    # get the list of the PDF files that haven't been validated yet
+    validated = get_validated_files(docs_path)
+    pdf_files = [pdf_file for pdf_file in os.listdir(docs_path) if pdf_file.endswith('.pdf') and pdf_file not in validated]
 
-    # try to open each PDF file
+    deleted = []
+
+    # validate each of the new PDF files
     for pdf_file in pdf_files:
-        try:
-            with open (docs_path + pdf_file, 'rb') as pdf_file_obj:
-                PdfReader(pdf_file_obj)
-        except Exception as exc:
+        if is_valid_pdf(docs_path + pdf_file):
+            set_file_validation(docs_path + pdf_file, True)
+        else:
             # delete the PDF file if it is broken
             os.remove(docs_path + pdf_file)
-            print('[italic yellow]Broken file deleted: ' + docs_path + pdf_file + '   [' + str(exc) + '][/italic yellow]')
-
-# %% ../nbs/02_arxiv_sync.ipynb 19
-def sync_arxiv(category: str):
-    """Synchronize all latest arxiv papers for `category`.
-       Concurrently download three PDF files from ArXiv. 
-       The PDF files will be saved in the `DOCS_PATH` folder 
-       under the category's sub-folder.
+            remove_file_validation(docs_path + pdf_file)
+            deleted.append(pdf_file)
+            print('[italic yellow]Broken file deleted: ' + docs_path + pdf_file + '[/italic yellow]')
+
+    return deleted
+
+# %% ../nbs/02_arxiv_sync.ipynb 28
+def download_concurrency() -> int:
+    """Return the number of concurrent downloads, as configured by `DOWNLOAD_CONCURRENCY`"""
+    return max(1, int(os.environ.get('DOWNLOAD_CONCURRENCY', 3)))
+
+def download_rate() -> float:
+    """Return the maximum number of download requests per second, as configured by `DOWNLOAD_RATE`"""
+    return float(os.environ.get('DOWNLOAD_RATE', 2))
+
+def download_retries() -> int:
+    """Return the number of times a failed download is retried, as configured by `DOWNLOAD_RETRIES`"""
+    return int(os.environ.get('DOWNLOAD_RETRIES', 3))
+
+# %% ../nbs/02_arxiv_sync.ipynb 29
+class TokenBucket:
+    """Rate limiter allowing `rate` acquisitions per second, with bursts of up to `capacity` acquisitions."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available, and consume it."""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1 or self.rate <= 0:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# %% ../nbs/02_arxiv_sync.ipynb 31
+class RetryableDownloadError(Exception):
+    """Raised when a download failed, but may succeed if retried."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+@traced()
+async def download_file(session: aiohttp.ClientSession, url: str, file_path: str, bucket: TokenBucket, retries: int = None, backoff: float = 1.0, validate=None) -> bool:
+    """Download `url` into `file_path`, through a temporary `.part` file renamed once the download is complete.
+    Partial downloads are resumed, failed downloads are retried with an exponential backoff.
+    If specified, `validate(path)` has to return True for the downloaded file to be accepted, otherwise it is downloaded again.
+    Returns True if the file has been downloaded, False otherwise."""
+    retries = download_retries() if retries is None else retries
+    part_path = file_path + '.part'
+
+    for attempt in range(retries + 1):
+        try:
+            await bucket.acquire()
+
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {'Range': 'bytes=' + str(offset) + '-'} if offset > 0 else {}
+
+            async with session.get(url, headers=headers) as response:
+                if response.status == 416:
+                    # the partial file doesn't match the remote file anymore, start over
+                    os.remove(part_path)
+                    raise RetryableDownloadError('invalid partial download')
+
+                if response.status == 429 or response.status == 408 or response.status >= 500:
+                    raise RetryableDownloadError('HTTP ' + str(response.status), retry_after_seconds(response.headers))
+
+                if response.status >= 400:
+                    print('[italic yellow]Download failed: ' + url + '   [HTTP ' + str(response.status) + '][/italic yellow]')
+                    return False
+
+                # the server doesn't support ranges, the whole file is sent again
+                if response.status != 206:
+                    offset = 0
+
+                with open(part_path, 'ab' if offset > 0 else 'wb') as part_file:
+                    async for block in response.content.iter_chunked(64 * 1024):
+                        part_file.write(block)
+                        count('download.bytes', len(block))
+
+                # validate the downloaded file against the size, and checksum, announced by the server
+                if response.status == 206 and '/' in response.headers.get('Content-Range', ''):
+                    expected_size = response.headers['Content-Range'].split('/')[-1]
+                else:
+                    expected_size = response.headers.get('Content-Length')
+
+                if expected_size is not None and expected_size.isdigit() and os.path.getsize(part_path) != int(expected_size):
+                    raise RetryableDownloadError('incomplete download')
+
+                if 'Content-MD5' in response.headers and offset == 0:
+                    with open(part_path, 'rb') as part_file:
+                        md5 = base64.b64encode(hashlib.md5(part_file.read()).digest()).decode()
+                    if md5 != response.headers['Content-MD5']:
+                        os.remove(part_path)
+                        raise RetryableDownloadError('checksum mismatch')
+
+            if validate is not None and not validate(part_path):
+                os.remove(part_path)
+                raise RetryableDownloadError('invalid file')
+
+            os.replace(part_path, file_path)
+            count('download.files')
+            return True
+        except (RetryableDownloadError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            if attempt == retries:
+                print('[italic yellow]Download failed: ' + url + '   [' + (str(exc) or type(exc).__name__) + '][/italic yellow]')
+                return False
+
+            count('download.retries')
+            delay = getattr(exc, 'retry_after', None)
+            await asyncio.sleep(delay if delay is not None else backoff * 2 ** attempt)
+
+    return False
+
+# %% ../nbs/02_arxiv_sync.ipynb 32
+async def download_files(downloads: list, concurrency: int = None, rate: float = None, retries: int = None, backoff: float = 1.0, validate=None, callback=None) -> dict:
+    """Concurrently download a list of `(url, file_path)` using a single HTTP session.
+    `validate(path)` is used to validate each downloaded file, and `callback(url, file_path, downloaded)` is called after each download.
+    Returns a dictionary where the keys are the file paths, and the values are True if they have been downloaded."""
+    concurrency = concurrency or download_concurrency()
+    rate = download_rate() if rate is None else rate
+
+    bucket = TokenBucket(rate, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers={'User-Agent': 'ReadNext'}) as session:
+
+        async def download(url: str, file_path: str):
+            async with semaphore:
+                downloaded = await download_file(session, url, file_path, bucket, retries, backoff, validate)
+
+            if callback is not None:
+                callback(url, file_path, downloaded)
+
+            return file_path, downloaded
+
+        return dict(await asyncio.gather(*[download(url, file_path) for url, file_path in downloads]))
+
+# %% ../nbs/02_arxiv_sync.ipynb 38
+@traced()
+def download_pdfs(docs_path: str, urls: list):
+    """Download the PDF files of the arxiv papers `urls` into the `docs_path` folder.
+       Broken PDF files are downloaded again.
     """
 
     # create the "docs" folder if it does not exist
-    docs_path = get_docs_path(category)
-
     if not os.path.exists(docs_path):
         print("[italic yellow]Creating directory '" + docs_path + "'[/italic yellow]")
         os.makedirs(docs_path)
 
     with Progress() as progress:
 
-        urls = get_arxiv_pdfs_url(category)
-
         task = progress.add_task("[cyan]Downloading papers...", total=len(urls))
 
-        def progress_indicator(future):
-            "Local progress indicator callback for the concurrent.futures module."
+        def progress_indicator(url, file_path, downloaded):
+            "Local progress indicator callback for the downloader."
+            # the downloaded files have been validated by the downloader
+            if downloaded:
+                set_file_validation(file_path, True)
+
             if not progress.finished:
                 progress.update(task, advance=1)
 
+        downloads = []
+        for url in urls:
+            # get the name of the PDF file
+            paper_name = get_paper_id(url)
+
+            # skip if the paper is already downloaded
+            if os.path.exists(docs_path + paper_name + '.pdf'):
+                if not progress.finished:
+                    progress.update(task, advance=1)
+                continue
+
+            # transform the URL to get the URL of the PDF file
+            downloads.append((re.sub('abs', 'pdf', url) + '.pdf', docs_path + paper_name + '.pdf'))
+
         # download each PDF from the URL list into the local "docs" folder
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            for url in urls:
-                # get the name of the PDF file
-                paper_name = url.split('/')[-1]
-
-                # skip if the paper is already downloaded
-                if os.path.exists(docs_path + paper_name + '.pdf'):
-                    if not progress.finished:
-                        progress.update(task, advance=1)
-                    continue
-
-                # transform the URL to get the URL of the PDF file
-                url = re.sub('abs', 'pdf', url) + '.pdf'
-
-                # download the PDF file
-                futures = [executor.submit(urllib.request.urlretrieve, url, docs_path + paper_name + '.pdf')]
-
-                # register the progress indicator callback for each of the future
-                for future in futures:
-                    future.add_done_callback(progress_indicator)
-
-    # delete possible broken PDF files during download.
-    # a better detection & fallback mechanism should be implemented in the future.
-    delete_broken_pdf(category)
+        asyncio.run(download_files(downloads, validate=is_valid_pdf, callback=progress_indicator))
+
+# %% ../nbs/02_arxiv_sync.ipynb 40
+@traced()
+def sync_arxiv_categories(categories: list) -> dict:
+    """Synchronize all latest arxiv papers of all the `categories` in the papers store.
+       Returns a dictionary of the list of categories of each paper, by arXiv ID.
+    """
+
+    papers = {}
+    urls = {}
+
+    for category in categories:
+        # `all` only exists to query the papers of every category, it has no feed
+        if category == 'all':
+            continue
+
+        for entry in get_arxiv_entries(category):
+            paper = parse_arxiv_entry(entry)
+
+            papers.setdefault(paper['id'], []).append(category)
+            urls[paper['id']] = entry.link
+            cache_set('abstract', paper['id'], json.dumps(paper))
+
+    download_pdfs(get_store_path(), list(urls.values()))
+
+    return papers
+
+def get_arxiv_abstract(paper_id: str) -> dict:
+    """Return the ID, the title and the abstract of the paper `paper_id`, as they appeared in its RSS feed.
+       Returns None if the paper has not been synchronized."""
+    paper = cache_get('abstract', paper_id)
+
+    return None if paper is None else json.loads(paper)
+
+# %% ../nbs/02_arxiv_sync.ipynb 45
+@traced()
+def get_arxiv_metadata(ids: list) -> dict:
+    """Return the metadata of the arXiv papers `ids`, by arXiv ID.
+       The papers that are not cached are retrieved with a single query to the arXiv API."""
+    metadata = {}
+    missing = []
+
+    for id in ids:
+        paper = cache_get('arxiv', id)
+
+        if paper is None:
+            missing.append(id)
+        else:
+            metadata[id] = json.loads(paper)
+
+    if len(missing) > 0:
+        for result in arxiv.Search(id_list=missing, max_results=len(missing)).results():
+            # the results are versioned IDs, the requested IDs may not be
+            id = result.get_short_id() if result.get_short_id() in missing else re.sub(r'v\d+$', '', result.get_short_id())
+
+            metadata[id] = {'id': id,
+                            'short_id': result.get_short_id(),
+                            'title': result.title,
+                            'summary': result.summary,
+                            'authors': [author.name for author in result.authors],
+                            'entry_id': result.entry_id,
+                            'pdf_url': result.pdf_url,
+                            'doi': result.doi,
+                            'category': result.primary_category}
+
+            cache_set('arxiv', id, json.dumps(metadata[id]))
+
+    return {id: metadata[id] for id in ids if id in metadata}
+
+# %% ../nbs/02_arxiv_sync.ipynb 50
+def get_local_pdf(paper_id: str) -> str:
+    """Return the path of the PDF file of the paper `paper_id` in any of the category folders of `DOCS_PATH`.
+       Return None if the paper hasn't been synchronized locally."""
+    docs_path = os.environ.get('DOCS_PATH').rstrip('/') + '/'
+
+    if not os.path.exists(docs_path):
+        return None
+
+    for entry in os.scandir(docs_path):
+        if entry.is_dir() and os.path.exists(docs_path + entry.name + '/' + paper_id + '.pdf'):
+            return docs_path + entry.name + '/' + paper_id + '.pdf'
+
+    return None
@@ -0,0 +1,437 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/10_benchmark.ipynb.
+
+# %% auto 0
+__all__ = ['COMMON_WORDS', 'TOPICS', 'make_corpus', 'make_pdf', 'make_feed', 'ArxivStandIn', 'arxiv_stand_in', 'ZoteroStub',
+           'replaced', 'timed_calls', 'stage_result', 'environment', 'run_benchmark', 'git_commit', 'run_benchmarks',
+           'compare_benchmarks']
+
+# %% ../nbs/10_benchmark.ipynb 4
+import asyncio
+import concurrent.futures
+import contextlib
+import feedparser
+import functools
+import inspect
+import json
+import multiprocessing
+import numpy as np
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+from . import __version__, arxiv_sync, personalize
+from .arxiv_sync import parse_arxiv_entry, download_files, is_valid_pdf, delete_broken_pdf, get_store_path
+from .cache import cache_set, get_cache_db, get_cache_path
+from .embedding import pdf_to_text, get_embeddings_batch, embedding_batch_size
+from .manifest import get_manifest_db, get_manifest_path
+from .personalize import save_personalized_papers_in_zotero
+from .tracing import peak_rss_mb
+from .vector_index import get_chroma_client, open_collection
+from rich import print
+
+# %% ../nbs/10_benchmark.ipynb 6
+COMMON_WORDS = ['we', 'propose', 'method', 'results', 'show', 'model', 'models', 'data', 'approach', 'performance', 'paper',
+                'new', 'based', 'using', 'task', 'tasks', 'learning', 'training', 'evaluation', 'state', 'art', 'novel']
+
+TOPICS = {'language': ['language', 'tokens', 'transformer', 'attention', 'pretraining', 'translation', 'summarization', 'prompting'],
+          'vision': ['image', 'images', 'convolutional', 'segmentation', 'detection', 'pixels', 'diffusion', 'video'],
+          'graphs': ['graph', 'nodes', 'edges', 'message', 'passing', 'molecules', 'link', 'prediction'],
+          'reinforcement': ['agent', 'reward', 'policy', 'environment', 'exploration', 'actions', 'planning', 'value'],
+          'theory': ['bound', 'convergence', 'theorem', 'proof', 'regret', 'complexity', 'sample', 'optimization'],
+          'retrieval': ['retrieval', 'search', 'ranking', 'queries', 'documents', 'index', 'recommendation', 'relevance']}
+
+def make_corpus(n: int, seed: int = 0) -> list:
+    """Return `n` synthetic papers, with their arXiv ID, title, abstract and text (a list of lines)"""
+    rng = random.Random(seed)
+    topics = list(TOPICS.keys())
+
+    def words(topic: str, count: int) -> str:
+        return ' '.join(rng.choice(TOPICS[topic] if rng.random() < 0.5 else COMMON_WORDS) for _ in range(count))
+
+    papers = []
+    for index in range(n):
+        topic = topics[index % len(topics)]
+        papers.append({'id': f'2401.{index:05d}',
+                       'topic': topic,
+                       'title': words(topic, 8).capitalize(),
+                       'abstract': words(topic, 60),
+                       'lines': [words(topic, 12) for _ in range(50)]})
+
+    return papers
+
+# %% ../nbs/10_benchmark.ipynb 8
+def make_pdf(paper: dict) -> bytes:
+    """Return a PDF document of a single page with the title, the abstract and the text of `paper`"""
+    def text(line: str) -> bytes:
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)').encode('latin-1', 'replace')
+
+    lines = [paper['title'], paper['abstract'][:100]] + paper['lines']
+    stream = b'BT /F1 9 Tf 40 770 Td 11 TL\n' + b''.join(b'(' + text(line) + b') Tj T*\n' for line in lines) + b'ET'
+
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+               b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+               b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>',
+               b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, content in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b'%d 0 obj\n' % number + content + b'\nendobj\n'
+
+    xref = len(pdf)
+    pdf += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1) + b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    pdf += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+
+    return pdf
+
+def make_feed(papers: list, url: str, category: str = 'cs.AI') -> str:
+    """Return the RSS feed of the `papers`, as served by the arXiv stand-in at `url`"""
+    items = ''.join(f"""<item rdf:about="{url}/abs/{paper['id']}">
+<title>{escape(paper['title'])} (arXiv:{paper['id']}v1 [{category}])</title>
+<link>{url}/abs/{paper['id']}</link>
+<description>&lt;p&gt;{escape(paper['abstract'])}&lt;/p&gt;</description>
+</item>
+""" for paper in papers)
+
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/">
+<channel rdf:about="{url}/rss/{category}">
+<title>{category} updates on arXiv.org</title>
+<link>{url}</link>
+</channel>
+{items}</rdf:RDF>
+"""
+
+# %% ../nbs/10_benchmark.ipynb 13
+class ArxivStandIn(BaseHTTPRequestHandler):
+    "Local stand-in of arXiv, that serves the RSS feed and the PDF files of a synthetic corpus"
+
+    def do_GET(self):
+        paper = self.server.papers.get(self.path.removeprefix('/pdf/').removesuffix('.pdf'))
+
+        if self.path.startswith('/rss/'):
+            body, content_type = self.server.feed, 'application/rss+xml'
+        elif self.path.startswith('/pdf/') and paper is not None:
+            body, content_type = make_pdf(paper), 'application/pdf'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def arxiv_stand_in(papers: list):
+    """Serve the `papers` from a local stand-in of arXiv. Yields its URL."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArxivStandIn)
+    server.daemon_threads = True
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    server.papers = {paper['id']: paper for paper in papers}
+    server.feed = make_feed(papers, url).encode('utf-8')
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        yield url
+    finally:
+        server.shutdown()
+        server.server_close()
+
+class ZoteroStub:
+    "Stub of the Zotero client, with a proposals collection that records the created items and their attachments instead of uploading them"
+
+    def __init__(self, latency: float = 0.0, titles: list = []):
+        self.latency = latency
+        self.items = [{'key': 'EXISTING' + str(index), 'data': {'title': title}} for index, title in enumerate(titles)]
+        self.batches = []
+        self.attachments = {}
+        self.lock = threading.Lock()
+
+    def request(self):
+        time.sleep(self.latency)
+
+    def collections(self) -> list:
+        self.request()
+        return [{'key': 'PROPOSALS', 'data': {'name': 'Readnext-Benchmark'}}]
+
+    def last_modified_version(self) -> int:
+        self.request()
+        return 1
+
+    def everything(self, query):
+        return query
+
+    def collection_items_top(self, collection: str) -> list:
+        self.request()
+        return list(self.items)
+
+    def item_template(self, itemtype: str) -> dict:
+        return {'itemType': itemtype, 'title': '', 'creators': [], 'collections': []}
+
+    def check_items(self, items: list):
+        pass
+
+    def create_items(self, items: list) -> dict:
+        self.request()
+
+        with self.lock:
+            start = len(self.items)
+            self.batches.append(len(items))
+            self.items.extend({'key': 'ITEM' + str(start + index), 'data': item} for index, item in enumerate(items))
+
+        return {'success': {str(index): 'ITEM' + str(start + index) for index in range(len(items))}}
+
+    def attachment_both(self, files: list, parentid: str):
+        self.request()
+
+        with self.lock:
+            self.attachments[parentid] = [name for name, path in files]
+
+# %% ../nbs/10_benchmark.ipynb 15
+@contextlib.contextmanager
+def replaced(module, name: str, value):
+    """Replace the global `name` of `module` by `value` for the duration of the context"""
+    original = getattr(module, name)
+    setattr(module, name, value)
+
+    try:
+        yield value
+    finally:
+        setattr(module, name, original)
+
+@contextlib.contextmanager
+def timed_calls(module, name: str, samples: list):
+    """Record the duration, in seconds, of each call of the function `name` of `module` in `samples`"""
+    function = getattr(module, name)
+
+    if inspect.iscoroutinefunction(function):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+    else:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                samples.append(time.perf_counter() - start)
+
+    with replaced(module, name, functools.wraps(function)(timed)):
+        yield samples
+
+def stage_result(papers: int, seconds: float, samples: list) -> dict:
+    """Return the measurements of a stage that processed `papers` in `seconds`, with the `samples` durations of its unit of work"""
+    p50, p95 = np.percentile(samples, [50, 95]) if len(samples) > 0 else (seconds, seconds)
+
+    return {'papers': papers,
+            'seconds': round(seconds, 4),
+            'papers_per_second': round(papers / seconds, 2) if seconds > 0 else None,
+            'p50_ms': round(p50 * 1000, 3),
+            'p95_ms': round(p95 * 1000, 3),
+            'peak_rss_mb': peak_rss_mb()}
+
+# %% ../nbs/10_benchmark.ipynb 17
+@contextlib.contextmanager
+def environment(variables: dict):
+    """Set the environment `variables` for the duration of the context"""
+    previous = {name: os.environ.get(name) for name in variables}
+    os.environ.update(variables)
+
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def run_benchmark(n: int, models_path: str, seed: int = 0, download_rate: float = 1000.0, broken_every: int = 50,
+                  proposals: int = 100, zotero_latency: float = 0.0) -> dict:
+    """Run the stages of `personalized-papers` on a synthetic corpus of `n` papers, and return their measurements"""
+    papers = make_corpus(n, seed)
+    workdir = tempfile.mkdtemp(prefix='readnext-benchmark-')
+    stages = {}
+
+    variables = {'DOCS_PATH': os.path.join(workdir, 'docs/'),
+                 'CHROMA_DB_PATH': os.path.join(workdir, 'chroma/'),
+                 'RECOMMENDATIONS_PATH': os.path.join(workdir, 'recommendations/'),
+                 'EMBEDDING_SYSTEM': 'BAAI/bge-base-en',
+                 'MODELS_PATH': models_path,
+                 'EMBEDDING_CHUNKING': 'truncate'}
+
+    with environment(variables), arxiv_stand_in(papers) as url:
+        store_path = get_store_path()
+        os.makedirs(store_path, exist_ok=True)
+
+        # 1. parse the RSS feed
+        start = time.perf_counter()
+        entries = feedparser.parse(url + '/rss/cs.AI').entries
+        for entry in entries:
+            paper = parse_arxiv_entry(entry)
+            cache_set('abstract', paper['id'], json.dumps(paper))
+        stages['feed'] = stage_result(len(entries), time.perf_counter() - start, [])
+
+        # 2. download the PDF files
+        downloads = [(entry.link.replace('/abs/', '/pdf/') + '.pdf', store_path + arxiv_sync.get_paper_id(entry.link) + '.pdf') for entry in entries]
+
+        with timed_calls(arxiv_sync, 'download_file', []) as samples:
+            start = time.perf_counter()
+            downloaded = asyncio.run(download_files(downloads, rate=download_rate, validate=is_valid_pdf))
+            stages['download'] = stage_result(sum(downloaded.values()), time.perf_counter() - start, samples)
+
+        # 3. validate the PDF files, some of them being broken
+        for file_path in sorted(os.listdir(store_path))[::broken_every]:
+            with open(store_path + file_path, 'r+b') as pdf_file:
+                pdf_file.truncate(100)
+
+        with timed_calls(arxiv_sync, 'is_valid_pdf', []) as samples:
+            start = time.perf_counter()
+            delete_broken_pdf()
+            stages['delete_broken_pdf'] = stage_result(len(samples), time.perf_counter() - start, samples)
+
+        # 4. extract the text of the PDF files
+        pdfs = sorted(os.listdir(store_path))
+        texts, samples = [], []
+        start = time.perf_counter()
+        for pdf in pdfs:
+            sample_start = time.perf_counter()
+            texts.append(pdf_to_text(store_path + pdf))
+            samples.append(time.perf_counter() - sample_start)
+        stages['pdf_to_text'] = stage_result(len(pdfs), time.perf_counter() - start, samples)
+
+        # 5. embed the texts
+        batch_size = embedding_batch_size()
+        batches = [(pdfs[index:index + batch_size], texts[index:index + batch_size]) for index in range(0, len(pdfs), batch_size)]
+        embeddings, samples = [], []
+        start = time.perf_counter()
+        for ids, docs in batches:
+            sample_start = time.perf_counter()
+            embeddings.append(get_embeddings_batch(docs))
+            samples.append(time.perf_counter() - sample_start)
+        stages['embed'] = stage_result(len(pdfs), time.perf_counter() - start, samples)
+
+        # 6. add the embeddings to Chroma
+        collection = open_collection(get_chroma_client(os.environ.get('CHROMA_DB_PATH')), 'all_benchmark')
+        samples = []
+        start = time.perf_counter()
+        for (ids, docs), batch_embeddings in zip(batches, embeddings):
+            sample_start = time.perf_counter()
+            collection.add(embeddings=batch_embeddings, metadatas=[{'source': pdf} for pdf in ids], ids=ids)
+            samples.append(time.perf_counter() - sample_start)
+        stages['chroma_add'] = stage_result(len(pdfs), time.perf_counter() - start, samples)
+
+        # 7. query the nearest neighbours of some papers
+        rng = random.Random(seed)
+        queries = rng.sample([embedding for batch_embeddings in embeddings for embedding in batch_embeddings], min(100, len(pdfs)))
+        samples = []
+        start = time.perf_counter()
+        for query in queries:
+            sample_start = time.perf_counter()
+            collection.query(query_embeddings=[query], n_results=min(10, len(pdfs)), include=['distances'])
+            samples.append(time.perf_counter() - sample_start)
+        stages['chroma_query'] = stage_result(len(queries), time.perf_counter() - start, samples)
+
+        # 8. upload the proposed papers to Zotero, their metadata and summaries are cached
+        corpus = {paper['id']: paper for paper in papers}
+        proposed = [pdf[:-len('.pdf')] for pdf in pdfs[:proposals]]
+
+        for id in proposed:
+            cache_set('arxiv', id, json.dumps({'id': id, 'short_id': id + 'v1', 'title': corpus[id]['title'], 'summary': corpus[id]['abstract'],
+                                               'authors': ['Ada Lovelace', 'Alan Turing'], 'entry_id': url + '/abs/' + id,
+                                               'pdf_url': url + '/pdf/' + id + '.pdf', 'doi': None, 'category': 'cs.AI'}))
+            cache_set('summary', id, 'Summary of ' + id)
+
+        zot = ZoteroStub(zotero_latency, titles=[corpus[id]['title'] for id in proposed[::10]])
+
+        with timed_calls(personalize, 'save_paper_artifacts', []) as samples, replaced(personalize, 'zotero_client', lambda: zot):
+            start = time.perf_counter()
+            save_personalized_papers_in_zotero({id: 1.0 for id in proposed}, 'Readnext-Benchmark', with_artifacts=True)
+            stages['zotero_upload'] = stage_result(len(proposed), time.perf_counter() - start, samples)
+
+        # tears down
+        get_cache_db(get_cache_path()).close()
+        get_manifest_db(get_manifest_path()).close()
+        get_cache_db.cache_clear()
+        get_manifest_db.cache_clear()
+        get_chroma_client.cache_clear()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    return {'papers': n, 'stages': stages, 'peak_rss_mb': peak_rss_mb()}
+
+# %% ../nbs/10_benchmark.ipynb 19
+def git_commit() -> str:
+    """Return the current commit of the repository of ReadNext, if it runs from one"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(sizes: list, models_path: str, isolate: bool = True, **options) -> dict:
+    """Run the benchmark for each of the `sizes` of corpus, in its own process if `isolate` is True"""
+    runs = {}
+
+    for n in sizes:
+        print(f"[green]Benchmarking {n} papers...[/green]")
+
+        if isolate:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                runs[str(n)] = executor.submit(run_benchmark, n, models_path, **options).result()
+        else:
+            runs[str(n)] = run_benchmark(n, models_path, **options)
+
+    return {'readnext': __version__,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'runs': runs}
+
+# %% ../nbs/10_benchmark.ipynb 21
+def compare_benchmarks(baseline: dict, current: dict, tolerance: float = 0.2) -> list:
+    """Return the regressions of the `current` benchmark results against the `baseline` results"""
+    regressions = []
+
+    def regressed(papers: str, stage: str, metric: str, before, after, higher_is_better: bool):
+        if before is None or after is None or before == 0:
+            return
+
+        if (after < before * (1 - tolerance)) if higher_is_better else (after > before * (1 + tolerance)):
+            regressions.append({'papers': int(papers), 'stage': stage, 'metric': metric, 'baseline': before, 'current': after,
+                                'change': round(after / before - 1, 3)})
+
+    for papers, run in current['runs'].items():
+        if papers not in baseline['runs']:
+            continue
+
+        for stage, result in run['stages'].items():
+            if stage not in baseline['runs'][papers]['stages']:
+                continue
+
+            before = baseline['runs'][papers]['stages'][stage]
+            regressed(papers, stage, 'papers_per_second', before['papers_per_second'], result['papers_per_second'], True)
+            regressed(papers, stage, 'p95_ms', before['p95_ms'], result['p95_ms'], False)
+
+        regressed(papers, 'all', 'peak_rss_mb', baseline['runs'][papers]['peak_rss_mb'], run['peak_rss_mb'], False)
+
+    return regressions
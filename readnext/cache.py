@@ -0,0 +1,96 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/05_cache.ipynb.
+
+# %% auto 0
+__all__ = ['get_cache_path', 'get_cache_db', 'cache_transaction', 'cache_get', 'cache_set', 'cache_delete', 'cache_expire']
+
+# %% ../nbs/05_cache.ipynb 3
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from functools import cache
+from .tracing import count
+
+# %% ../nbs/05_cache.ipynb 5
+def get_cache_path() -> str:
+    "Generate the path of the cache database from the `DOCS_PATH`"
+    return os.environ.get('DOCS_PATH').rstrip('/') + '/cache.sqlite'
+
+# %% ../nbs/05_cache.ipynb 7
+@cache
+def get_cache_db(path: str) -> sqlite3.Connection:
+    """Open, and create if needed, the cache database at `path`"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value BLOB, updated_at REAL, PRIMARY KEY (namespace, key))")
+
+    # migrate the caches created without the time of the values
+    if 'updated_at' not in [column[1] for column in db.execute("PRAGMA table_info(cache)")]:
+        with cache_transaction(db):
+            db.execute("ALTER TABLE cache ADD COLUMN updated_at REAL")
+            db.execute("UPDATE cache SET updated_at = ?", (time.time(),))
+
+    return db
+
+# the connections are shared by the threads, their writers are serialized
+_cache_writer = threading.Lock()
+
+@contextlib.contextmanager
+def cache_transaction(db: sqlite3.Connection):
+    """Run the writes of the context on the cache connection `db` in a single transaction, rolled back if they fail.
+    The transactions of the threads are serialized."""
+    with _cache_writer:
+        db.execute("BEGIN")
+
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        db.execute("COMMIT")
+
+# %% ../nbs/05_cache.ipynb 9
+def cache_get(namespace: str, key: str) -> str:
+    """Get the value of `key` in the `namespace` of the cache. Return None if it is not cached."""
+    row = get_cache_db(get_cache_path()).execute("SELECT value FROM cache WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+
+    count('cache.' + namespace + ('.misses' if row is None else '.hits'))
+
+    if row is None:
+        return None
+
+    return zlib.decompress(row[0]).decode('utf-8')
+
+def cache_set(namespace: str, key: str, value: str):
+    """Set the `value` of `key` in the `namespace` of the cache."""
+    value = zlib.compress(value.encode('utf-8'))
+
+    with cache_transaction(get_cache_db(get_cache_path())) as db:
+        db.execute("INSERT OR REPLACE INTO cache (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)", (namespace, key, value, time.time()))
+
+def cache_delete(namespace: str, keys: list):
+    """Delete the values of the `keys` in the `namespace` of the cache."""
+    with cache_transaction(get_cache_db(get_cache_path())) as db:
+        db.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", [(namespace, key) for key in keys])
+
+def cache_expire(before: float, namespaces: list = None, dry_run: bool = False) -> int:
+    """Delete the values written before the `before` timestamp, from the `namespaces` (all the namespaces by default).
+    Returns the number of expired values. With `dry_run`, the values are only counted."""
+    db = get_cache_db(get_cache_path())
+
+    where = "updated_at < ?"
+    parameters = [before]
+    if namespaces is not None:
+        where += " AND namespace IN (" + ", ".join(["?"] * len(namespaces)) + ")"
+        parameters += namespaces
+
+    if dry_run:
+        return db.execute("SELECT COUNT(*) FROM cache WHERE " + where, parameters).fetchone()[0]
+
+    with cache_transaction(db):
+        return db.execute("DELETE FROM cache WHERE " + where, parameters).rowcount
@@ -1,19 +1,41 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/03_embedding.ipynb.
 
 # %% auto 0
-__all__ = ['download_embedding_model', 'load_embedding_model', 'embed_text', 'embedding_system', 'get_embeddings', 'pdf_to_text',
-           'get_pdfs_from_folder', 'embed_category_papers']
+__all__ = ['COHERE_BATCH_SIZE', 'download_embedding_model', 'load_embedding_model', 'embedding_threads', 'embedding_device',
+           'embedding_precision', 'embedding_backend', 'load_configured_embedding_model', 'export_onnx_model',
+           'OnnxEmbeddingModel', 'embed_text', 'embedding_batch_size', 'embed_texts', 'benchmark_inference',
+           'embedding_chunking', 'embedding_chunk_overlap', 'embedding_store_chunks', 'embedding_pooling',
+           'embedding_pooling_k', 'chunk_token_windows', 'pool_embeddings', 'embed_texts_chunks', 'embed_text_chunks',
+           'embedding_system', 'cohere_concurrency', 'cohere_retries', 'get_cohere_client', 'cohere_client',
+           'cohere_request', 'cohere_embed', 'get_embeddings', 'get_embeddings_and_chunks', 'get_embeddings_batch',
+           'pdf_max_pages', 'pdf_to_text', 'file_sha256', 'text_cache_key', 'cached_pdf_to_text',
+           'get_pdfs_from_folder', 'pdf_extract_timeout', 'pdf_to_text_with_timeout', 'extract_pdfs_text',
+           'get_existing_ids', 'get_abstract_ids', 'get_new_pdfs', 'chroma_store_text', 'chroma_documents',
+           'abstract_metadata', 'get_paper_text', 'category_flag', 'categories_where', 'papers_metadata',
+           'add_papers_categories', 'migrate_category_collections', 'embed_papers', 'embed_category_abstracts']
 
 # %% ../nbs/03_embedding.ipynb 3
-import chromadb
 import cohere
+import concurrent.futures
+import hashlib
+import importlib.util
+import inspect
 import os
+import pypdf
+import signal
+import threading
+import time
 import torch
 from chromadb.errors import IDAlreadyExistsError
 from functools import cache 
 from pypdf import PdfReader
 from .arxiv_categories import exists
-from .arxiv_sync import get_docs_path
+from .arxiv_sync import get_arxiv_abstracts, get_arxiv_abstract, get_local_pdf
+from .cache import cache_get, cache_set
+from .vector_index import open_collection, get_chroma_client
+from .manifest import get_embedded_ids, set_embedded_ids, clear_embedded_ids, get_paper_categories, add_paper_categories
+from .retry import retry_after_seconds
+from .tracing import traced, count, tracing
 from rich import print
 from rich.progress import Progress
 from transformers import AutoTokenizer, AutoModel
@@ -36,28 +58,307 @@ def download_embedding_model(model_path: str, model_name: str):
 
 # %% ../nbs/03_embedding.ipynb 10
 @cache
-def load_embedding_model(model_path: str):
-    """Load a Hugging Face model and tokenizer from the specified directory"""
+def load_embedding_model(model_path: str, device: str = 'cpu', precision: str = 'fp32', backend: str = 'torch', threads: int = None):
+    """Load a Hugging Face model and tokenizer from the specified directory, for the inference configuration
+    (`device`, `precision`, `backend` and number of `threads`)"""
+    if backend == 'onnx':
+        missing = [package for package in ['onnx', 'onnxruntime'] if importlib.util.find_spec(package) is None]
+
+        if missing:
+            raise ImportError("The ONNX backend requires the " + " and ".join(missing) + " packages, install them with: pip install 'readnext[onnx]'")
+
     tokenizer = AutoTokenizer.from_pretrained(model_path)
     model = AutoModel.from_pretrained(model_path)
-    return model, tokenizer
+    model.eval()
+
+    if threads is not None:
+        torch.set_num_threads(threads)
+
+    if backend == 'onnx':
+        if device != 'cpu' or precision != 'fp32':
+            print("[yellow]The ONNX backend only runs in fp32 on CPU, ignoring the device and precision.[/yellow]")
+
+        return OnnxEmbeddingModel(export_onnx_model(model, tokenizer, model_path), model.config, threads), tokenizer
+
+    match precision:
+        case 'int8':
+            if device == 'cpu':
+                # dynamic quantization of the weights of the linear layers, the activations are quantized on the fly
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            else:
+                print("[yellow]int8 quantization is only supported on CPU, using fp32.[/yellow]")
+        case 'bf16':
+            model = model.to(torch.bfloat16)
+        case 'fp16':
+            if device == 'cpu':
+                print("[yellow]fp16 is not supported on CPU, using fp32.[/yellow]")
+            else:
+                model = model.half()
+
+    return model.to(device), tokenizer
 
 # %% ../nbs/03_embedding.ipynb 15
+def embedding_threads() -> int:
+    """Return the number of threads of the local model, as configured by `EMBEDDING_THREADS`. None if not configured."""
+    return int(os.environ.get('EMBEDDING_THREADS')) if os.environ.get('EMBEDDING_THREADS') else None
+
+def embedding_device() -> str:
+    """Return the device of the local model, as configured by `EMBEDDING_DEVICE`"""
+    device = os.environ.get('EMBEDDING_DEVICE', 'cpu').lower()
+
+    if device == 'auto':
+        if torch.cuda.is_available():
+            return 'cuda'
+        if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+            return 'mps'
+        return 'cpu'
+
+    return device
+
+def embedding_precision() -> str:
+    """Return the precision of the local model, as configured by `EMBEDDING_PRECISION`"""
+    return os.environ.get('EMBEDDING_PRECISION', 'fp32').lower()
+
+def embedding_backend() -> str:
+    """Return the inference backend of the local model, as configured by `EMBEDDING_BACKEND`"""
+    return os.environ.get('EMBEDDING_BACKEND', 'torch').lower()
+
+def load_configured_embedding_model(model_path: str):
+    """Load the local model from `model_path`, with the configured inference backend"""
+    return load_embedding_model(model_path, embedding_device(), embedding_precision(), embedding_backend(), embedding_threads())
+
+# %% ../nbs/03_embedding.ipynb 16
+def export_onnx_model(model, tokenizer, model_path: str) -> str:
+    """Export `model` in the ONNX format in `model_path`, if it is not already exported. Returns the path of the ONNX model."""
+    onnx_path = os.path.join(model_path, 'model.onnx')
+
+    if not os.path.exists(onnx_path):
+        encoded_input = tokenizer(['ReadNext'], return_tensors='pt')
+        # the inputs of the graph follow the order of the arguments of the model
+        inputs = {name: encoded_input[name] for name in inspect.signature(model.forward).parameters if name in encoded_input}
+
+        torch.onnx.export(model,
+                          (inputs,),
+                          onnx_path,
+                          input_names=list(inputs.keys()),
+                          output_names=['last_hidden_state'],
+                          dynamic_axes={**{name: {0: 'batch', 1: 'sequence'} for name in inputs.keys()},
+                                        'last_hidden_state': {0: 'batch', 1: 'sequence'}},
+                          opset_version=14)
+
+    return onnx_path
+
+class OnnxEmbeddingModel:
+    "A model exported in the ONNX format, run by ONNX Runtime, that can be used in place of the Hugging Face model"
+
+    def __init__(self, onnx_path: str, config, threads: int = None):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if threads is not None:
+            options.intra_op_num_threads = threads
+
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [input.name for input in self.session.get_inputs()]
+        self.config = config
+        self.device = torch.device('cpu')
+
+    def __call__(self, **inputs):
+        # the inputs that are not provided (such as the `token_type_ids` of padded chunks) are zeros
+        feed = {name: (inputs[name] if name in inputs else torch.zeros_like(inputs['input_ids'])).numpy() for name in self.input_names}
+
+        return (torch.from_numpy(self.session.run(['last_hidden_state'], feed)[0]),)
+
+# %% ../nbs/03_embedding.ipynb 21
+@traced()
 def embed_text(text: str, model, tokenizer):
     """Embed a text using a Hugging Face model and tokenizer"""
-    encoded_input = tokenizer(text, padding=True, truncation=True, return_tensors='pt')
+    encoded_input = tokenizer(text, padding=True, truncation=True, return_tensors='pt').to(model.device)
+
+    if tracing():
+        count('embed.tokens', int(encoded_input['attention_mask'].sum()))
 
     # Compute token embeddings
-    with torch.no_grad():
+    with torch.inference_mode():
         model_output = model(**encoded_input)
         # Perform pooling. In this case, cls pooling.
-        sentence_embeddings = model_output[0][:, 0]
+        sentence_embeddings = model_output[0][:, 0].float().cpu()
 
     embeddings = torch.nn.functional.normalize(sentence_embeddings, p=2, dim=1)
 
     return embeddings
 
-# %% ../nbs/03_embedding.ipynb 20
+# %% ../nbs/03_embedding.ipynb 26
+def embedding_batch_size() -> int:
+    """Return the number of texts to embed per forward pass (or per batch of requests to the embedding service), as configured by `EMBEDDING_BATCH_SIZE`"""
+    if os.environ.get('EMBEDDING_BATCH_SIZE'):
+        return max(1, int(os.environ.get('EMBEDDING_BATCH_SIZE')))
+
+    return COHERE_BATCH_SIZE * cohere_concurrency() if os.environ.get('EMBEDDING_SYSTEM') == 'cohere' else 16
+
+# %% ../nbs/03_embedding.ipynb 27
+def embed_texts(texts: list, model, tokenizer, batch_size: int = None):
+    """Embed a list of texts using a Hugging Face model and tokenizer, `batch_size` texts per forward pass.
+    The texts are bucketed by length to minimize padding. Embeddings are returned in the input order."""
+    if batch_size is None:
+        batch_size = embedding_batch_size()
+
+    # sort the texts by length such that each batch contains texts of similar lengths
+    order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+
+    embeddings = [None] * len(texts)
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+
+        for index, embedding in zip(batch, embed_text([texts[index] for index in batch], model, tokenizer)):
+            embeddings[index] = embedding
+
+    return torch.stack(embeddings) if len(embeddings) > 0 else torch.empty(0)
+
+# %% ../nbs/03_embedding.ipynb 32
+def benchmark_inference(texts: list, model_path: str, configurations: list, tolerance: float = 0.01, batch_size: int = None) -> list:
+    """Benchmark the inference `configurations` of the local model against the fp32 baseline on CPU.
+    Returns the throughput, the speedup, and the drift of the embeddings, of the baseline and of each configuration."""
+
+    def run(configuration: dict) -> tuple:
+        # the number of threads is global to the process, and isn't set again when the model is already loaded
+        threads = torch.get_num_threads()
+
+        try:
+            model, tokenizer = load_embedding_model(model_path, **configuration)
+
+            if configuration.get('threads') is not None:
+                torch.set_num_threads(configuration['threads'])
+
+            # warm up, such that the first forward pass is not measured
+            embed_texts(texts[:1], model, tokenizer, batch_size)
+
+            start = time.perf_counter()
+            embeddings = embed_texts(texts, model, tokenizer, batch_size)
+
+            return embeddings, len(texts) / (time.perf_counter() - start)
+        finally:
+            torch.set_num_threads(threads)
+
+    baseline, baseline_throughput = run({})
+
+    results = []
+    for configuration in [{}] + configurations:
+        embeddings, throughput = (baseline, baseline_throughput) if configuration == {} else run(configuration)
+        drift = float((1 - (embeddings * baseline).sum(dim=1)).max())
+
+        results.append({'configuration': configuration,
+                        'throughput': throughput,
+                        'speedup': throughput / baseline_throughput,
+                        'drift': drift,
+                        'within_tolerance': drift <= tolerance})
+
+    return results
+
+# %% ../nbs/03_embedding.ipynb 37
+def embedding_chunking() -> bool:
+    """Return True if long texts have to be embedded in chunks, as configured by `EMBEDDING_CHUNKING`"""
+    return os.environ.get('EMBEDDING_CHUNKING', 'truncate').lower() == 'chunk'
+
+def embedding_chunk_overlap() -> int:
+    """Return the number of tokens shared by two consecutive chunks, as configured by `EMBEDDING_CHUNK_OVERLAP`"""
+    return int(os.environ.get('EMBEDDING_CHUNK_OVERLAP', 64))
+
+def embedding_store_chunks() -> bool:
+    """Return True if the embeddings of the chunks have to be saved in Chroma, as configured by `EMBEDDING_STORE_CHUNKS`"""
+    return embedding_chunking() and os.environ.get('EMBEDDING_STORE_CHUNKS', 'false').lower() == 'true'
+
+def embedding_pooling() -> str:
+    """Return the pooling strategy of the embeddings of the chunks, as configured by `EMBEDDING_POOLING`"""
+    return os.environ.get('EMBEDDING_POOLING', 'mean').lower()
+
+def embedding_pooling_k() -> int:
+    """Return the number of chunks pooled by the `first-k` pooling strategy, as configured by `EMBEDDING_POOLING_K`"""
+    return int(os.environ.get('EMBEDDING_POOLING_K', 4))
+
+# %% ../nbs/03_embedding.ipynb 38
+def chunk_token_windows(input_ids: list, window: int, overlap: int) -> list:
+    """Split a list of tokens into windows of `window` tokens, where two consecutive windows share `overlap` tokens."""
+    stride = max(window - overlap, 1)
+    windows = []
+
+    for start in range(0, max(len(input_ids), 1), stride):
+        windows.append(input_ids[start:start + window])
+
+        if start + window >= len(input_ids):
+            break
+
+    return windows
+
+# %% ../nbs/03_embedding.ipynb 39
+def pool_embeddings(chunks, pooling: str = None, k: int = None):
+    """Pool the embeddings of the chunks of a document into a single normalized embedding."""
+    pooling = pooling or embedding_pooling()
+
+    match pooling:
+        case 'max':
+            pooled = chunks.max(dim=0).values
+        case 'first-k':
+            pooled = chunks[:max(k or embedding_pooling_k(), 1)].mean(dim=0)
+        case _:
+            pooled = chunks.mean(dim=0)
+
+    return torch.nn.functional.normalize(pooled, p=2, dim=0)
+
+# %% ../nbs/03_embedding.ipynb 40
+@traced()
+def embed_texts_chunks(texts: list, model, tokenizer, overlap: int = None, batch_size: int = None) -> list:
+    """Embed all the chunks of a list of texts using a Hugging Face model and tokenizer.
+    The chunks of all the texts are bucketed by length, `batch_size` chunks per forward pass.
+    Returns the embeddings of the chunks of each text, in the input order."""
+    overlap = embedding_chunk_overlap() if overlap is None else overlap
+    batch_size = batch_size or embedding_batch_size()
+
+    # number of tokens per window, leaving room for the special tokens added by the tokenizer
+    max_length = min(tokenizer.model_max_length, model.config.max_position_embeddings)
+    window = max_length - tokenizer.num_special_tokens_to_add()
+
+    windows = []
+    counts = []
+
+    for text in texts:
+        input_ids = tokenizer(text, add_special_tokens=False, truncation=False, verbose=False)['input_ids']
+        text_windows = [tokenizer.build_inputs_with_special_tokens(ids) for ids in chunk_token_windows(input_ids, window, overlap)]
+
+        windows.extend(text_windows)
+        counts.append(len(text_windows))
+
+    if tracing():
+        count('embed.tokens', sum(len(ids) for ids in windows))
+
+    # sort the windows by length such that each batch contains windows of similar lengths
+    order = sorted(range(len(windows)), key=lambda index: len(windows[index]))
+
+    embeddings = [None] * len(windows)
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        encoded_input = tokenizer.pad({'input_ids': [windows[index] for index in batch]}, return_tensors='pt').to(model.device)
+
+        with torch.inference_mode():
+            model_output = model(**encoded_input)
+
+        # Perform pooling. In this case, cls pooling.
+        for index, embedding in zip(batch, model_output[0][:, 0].float().cpu()):
+            embeddings[index] = embedding
+
+    if len(embeddings) == 0:
+        return []
+
+    return list(torch.split(torch.nn.functional.normalize(torch.stack(embeddings), p=2, dim=1), counts))
+
+def embed_text_chunks(text: str, model, tokenizer, overlap: int = None, batch_size: int = None):
+    """Embed all the chunks of a text using a Hugging Face model and tokenizer.
+    Returns one embedding per chunk."""
+    return embed_texts_chunks([text], model, tokenizer, overlap, batch_size)[0]
+
+# %% ../nbs/03_embedding.ipynb 46
 def embedding_system() -> str:
     """Return a unique identifier for the embedding system currently in use"""
 
@@ -68,86 +369,541 @@ def embedding_system() -> str:
     else:
         return ''
 
-# %% ../nbs/03_embedding.ipynb 22
+# %% ../nbs/03_embedding.ipynb 48
+COHERE_BATCH_SIZE = 96
+
+def cohere_concurrency() -> int:
+    """Return the number of concurrent requests to Cohere, as configured by `COHERE_CONCURRENCY`"""
+    return max(1, int(os.environ.get('COHERE_CONCURRENCY', 4)))
+
+def cohere_retries() -> int:
+    """Return the number of times a failed request to Cohere is retried, as configured by `COHERE_RETRIES`"""
+    return int(os.environ.get('COHERE_RETRIES', 5))
+
+@cache
+def get_cohere_client(api_key: str, concurrency: int) -> cohere.Client:
+    """Return the Cohere client of `api_key`, that sends up to `concurrency` requests at a time.
+    The failed requests are retried by `cohere_request`."""
+    return cohere.Client(api_key, num_workers=concurrency, max_retries=0, check_api_key=False)
+
+def cohere_client() -> cohere.Client:
+    """Return the Cohere client of the API key configured with `COHERE_API_KEY`"""
+    return get_cohere_client(os.environ.get('COHERE_API_KEY'), cohere_concurrency())
+
+# %% ../nbs/03_embedding.ipynb 49
+@traced()
+def cohere_request(request, retries: int = None, backoff: float = 1.0):
+    """Return the result of `request`, a function that calls the Cohere API. The rate limited, or failed, calls are retried
+    after the delay of their `Retry-After` header, or with an exponential backoff."""
+    retries = cohere_retries() if retries is None else retries
+
+    for attempt in range(retries + 1):
+        try:
+            return request()
+        except cohere.CohereAPIError as exc:
+            # only the rate limited requests and the server errors are retried, the other errors would fail again
+            if not (exc.http_status == 429 or (exc.http_status or 0) >= 500) or attempt == retries:
+                raise
+
+            delay = retry_after_seconds(exc.headers)
+        except cohere.CohereError:
+            # connection and server errors
+            if attempt == retries:
+                raise
+
+            delay = None
+
+        time.sleep(delay if delay is not None else backoff * 2 ** attempt)
+
+def cohere_embed(texts: list, batch_size: int = COHERE_BATCH_SIZE, concurrency: int = None) -> list:
+    """Embed `texts` with Cohere, `batch_size` texts per request, `concurrency` requests at a time.
+    The embeddings are returned in the input order."""
+    client = cohere_client()
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+
+    def embed(batch: list) -> list:
+        return cohere_request(lambda: client.embed(batch).embeddings)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency or cohere_concurrency()) as executor:
+        return [embedding for embeddings in executor.map(embed, batches) for embedding in embeddings]
+
+# %% ../nbs/03_embedding.ipynb 54
 def get_embeddings(text: str) -> list:
     """Get embeddings for a text using any supported embedding system."""
+    return get_embeddings_batch([text])
+
+# %% ../nbs/03_embedding.ipynb 56
+@traced()
+def get_embeddings_and_chunks(texts: list) -> tuple:
+    """Get embeddings for a list of texts using any supported embedding system.
+    Returns the embeddings of the texts, and the list of the embeddings of the chunks of each text."""
+
+    if len(texts) == 0:
+        return [], []
+
+    count('embed.texts', len(texts))
 
     match embedding_system():
         case 'baai-bge-base-en':
-            model, tokenizer = load_embedding_model(os.environ.get('MODELS_PATH'))
-            return embed_text(text, model, tokenizer).tolist()
+            model, tokenizer = load_configured_embedding_model(os.environ.get('MODELS_PATH'))
+
+            if embedding_chunking():
+                chunks = embed_texts_chunks(texts, model, tokenizer)
+                return [pool_embeddings(text_chunks).tolist() for text_chunks in chunks], [text_chunks.tolist() for text_chunks in chunks]
+
+            return embed_texts(texts, model, tokenizer).tolist(), [[] for _ in texts]
         case 'cohere':
-            co = cohere.Client(os.environ.get('COHERE_API_KEY'))
-            return co.embed([text]).embeddings
+            return cohere_embed(texts), [[] for _ in texts]
         case other:
-            return []
+            return [], []
+
+def get_embeddings_batch(texts: list) -> list:
+    """Get embeddings for a list of texts using any supported embedding system."""
+    return get_embeddings_and_chunks(texts)[0]
+
+# %% ../nbs/03_embedding.ipynb 58
+def pdf_max_pages() -> int:
+    """Return the maximum number of pages to extract from a PDF file, as configured by `PDF_MAX_PAGES`. 0 means all the pages."""
+    return int(os.environ.get('PDF_MAX_PAGES', 0))
+
+@traced()
+def pdf_to_text(file_path: str, max_pages: int = None) -> str:
+    """Read a PDF file and output it as a text string. Only the first `max_pages` pages are read if specified."""
+    max_pages = pdf_max_pages() if max_pages is None else max_pages
 
-# %% ../nbs/03_embedding.ipynb 24
-def pdf_to_text(file_path: str) -> str:
-    """Read a PDF file and output it as a text string."""
     with open(file_path, 'rb') as pdf_file_obj:
         pdf_reader = PdfReader(pdf_file_obj)
-        return ''.join(page.extract_text() for page in pdf_reader.pages)
+        pages = pdf_reader.pages[:max_pages] if max_pages > 0 else pdf_reader.pages
+        count('pdf.pages', len(pages))
+        return ''.join(page.extract_text() for page in pages)
+
+# %% ../nbs/03_embedding.ipynb 62
+def file_sha256(file_path: str) -> str:
+    """Return the SHA-256 hash of the content of a file."""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def text_cache_key(file_path: str) -> str:
+    """Return the key of the extracted text of a PDF file in the cache."""
+    key = file_sha256(file_path) + ':pypdf-' + pypdf.__version__
+
+    if pdf_max_pages() > 0:
+        key += ':pages-' + str(pdf_max_pages())
+
+    return key
 
-# %% ../nbs/03_embedding.ipynb 28
+# %% ../nbs/03_embedding.ipynb 63
+def cached_pdf_to_text(file_path: str) -> str:
+    """Read a PDF file and output it as a text string. The text is read from the cache when available."""
+    key = text_cache_key(file_path)
+
+    text = cache_get('text', key)
+
+    if text is None:
+        text = pdf_to_text(file_path)
+        cache_set('text', key, text)
+
+    return text
+
+# %% ../nbs/03_embedding.ipynb 68
 def get_pdfs_from_folder(folder_path: str) -> list:
     """Given a folder path, return all the PDF files existing in that folder."""
     return [pdf for pdf in os.listdir(folder_path) if pdf.endswith(".pdf")]
 
-# %% ../nbs/03_embedding.ipynb 34
-def embed_category_papers(category: str) -> bool:
-    """Given a ArXiv category, create the embeddings for each of the PDF paper existing locally.
-    Embeddings is currently using Cohere's embedding service.
+# %% ../nbs/03_embedding.ipynb 72
+def pdf_extract_timeout() -> int:
+    """Return the number of seconds after which the extraction of a PDF file is interrupted, as configured by `PDF_EXTRACT_TIMEOUT`"""
+    return int(os.environ.get('PDF_EXTRACT_TIMEOUT', 60))
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError("PDF text extraction timed out")
+
+def pdf_to_text_with_timeout(file_path: str, timeout: int) -> str:
+    """Read a PDF file and output it as a text string. Raise a `TimeoutError` if it takes more than `timeout` seconds.
+    The timeout is only enforced on platforms supporting `SIGALRM`, in the main thread."""
+    if not hasattr(signal, 'SIGALRM') or timeout <= 0 or threading.current_thread() is not threading.main_thread():
+        return pdf_to_text(file_path)
+
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return pdf_to_text(file_path)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+# %% ../nbs/03_embedding.ipynb 73
+def extract_pdfs_text(file_paths: list, workers: int = None, queue_size: int = None, timeout: int = None):
+    """Extract the text of the PDF `file_paths` using a pool of `workers` processes.
+    Yield `(file_path, key, text)` tuples as the extractions complete, with at most `queue_size` extractions in flight.
+    `key` is the key of the text in the cache, `None` if the PDF file couldn't be read.
+    `text` is `None` if the PDF file couldn't be read, or if its extraction timed out.
+    Texts are read from, and saved in, the cache."""
+    workers = workers or os.cpu_count() or 1
+    queue_size = max(queue_size or 2 * workers, 1)
+    timeout = pdf_extract_timeout() if timeout is None else timeout
+
+    def result(file_path, extract):
+        try:
+            text = extract()
+            cache_set('text', keys[file_path], text)
+            return file_path, keys[file_path], text
+        except TimeoutError:
+            print("[yellow]Text extraction timed out, skipping: " + file_path + "[/yellow]")
+        except Exception as exc:
+            print("[yellow]Can't extract text, skipping: " + file_path + "   [" + str(exc) + "][/yellow]")
+        return file_path, keys[file_path], None
+
+    # get the texts that have already been extracted from the cache
+    keys = {}
+    to_extract = []
+    for file_path in file_paths:
+        try:
+            keys[file_path] = text_cache_key(file_path)
+        except OSError as exc:
+            print("[yellow]Can't read file, skipping: " + file_path + "   [" + str(exc) + "][/yellow]")
+            yield file_path, None, None
+            continue
+
+        text = cache_get('text', keys[file_path])
+
+        if text is None:
+            to_extract.append(file_path)
+        else:
+            yield file_path, keys[file_path], text
+
+    # the timeout alarm can only be installed by the main thread, the other threads use a worker process
+    if workers == 1 and threading.current_thread() is threading.main_thread():
+        for file_path in to_extract:
+            yield result(file_path, lambda: pdf_to_text_with_timeout(file_path, timeout))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = iter(to_extract)
+        in_flight = {}
+
+        def submit_next() -> bool:
+            file_path = next(pending, None)
+            if file_path is None:
+                return False
+            in_flight[executor.submit(pdf_to_text_with_timeout, file_path, timeout)] = file_path
+            return True
+
+        # fill the queue, then refill it every time an extraction completes
+        while len(in_flight) < queue_size and submit_next():
+            pass
+
+        while in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield result(in_flight.pop(future), future.result)
+                submit_next()
+
+# %% ../nbs/03_embedding.ipynb 79
+def get_existing_ids(collection, ids: list, chunk_size: int = 1000) -> set:
+    """Return the IDs of `ids` that exist in the Chroma `collection`, using bulk queries of `chunk_size` IDs."""
+    existing = set()
+
+    for start in range(0, len(ids), chunk_size):
+        existing.update(collection.get(ids=ids[start:start + chunk_size], include=[])['ids'])
+
+    return existing
+
+def get_abstract_ids(collection, ids: list, chunk_size: int = 1000) -> set:
+    """Return the IDs of `ids` whose embedding in the Chroma `collection` has been created from their abstract, using bulk queries of `chunk_size` IDs."""
+    abstracts = set()
+
+    for start in range(0, len(ids), chunk_size):
+        papers = collection.get(ids=ids[start:start + chunk_size], include=['metadatas'])
+        abstracts.update([pdf for pdf, metadata in zip(papers['ids'], papers['metadatas']) if (metadata or {}).get('content') == 'abstract'])
+
+    return abstracts
+
+def get_new_pdfs(collection, pdfs: list) -> list:
+    """Return the PDF files of `pdfs` that are not yet embedded in the Chroma `collection`,
+    or whose embedding has been created from their abstract only."""
+    # the manifest is stale if it lists more papers than the collection contains
+    if len(get_embedded_ids(collection.name)) > collection.count():
+        clear_embedded_ids(collection.name)
+
+    embedded = get_embedded_ids(collection.name, 'pdf')
+    candidates = [pdf for pdf in pdfs if pdf not in embedded]
+
+    # papers embedded before they got recorded in the manifest, or before the manifest recorded the source of their embedding
+    existing = get_existing_ids(collection, candidates)
+    existing = existing - get_abstract_ids(collection, list(existing))
+    if len(existing) > 0:
+        set_embedded_ids(collection.name, list(existing))
+
+    return [pdf for pdf in candidates if pdf not in existing]
+
+# %% ../nbs/03_embedding.ipynb 84
+def chroma_store_text() -> bool:
+    """Return True if the full text of the papers has to be saved in Chroma, as configured by `CHROMA_STORE_TEXT`"""
+    return os.environ.get('CHROMA_STORE_TEXT', 'false').lower() == 'true'
+
+def chroma_documents(docs: list) -> list:
+    """Return the Chroma documents of the texts `docs`, or None if the texts are not saved in Chroma."""
+    if not chroma_store_text():
+        return None
+
+    return [doc.encode("unicode_escape").decode() for doc in docs] # necessary escape to prevent possible encoding errors when adding to Chroma
+
+def abstract_metadata(paper_id: str) -> dict:
+    "Return the title and the abstract of a paper, as metadata. Empty if they are unknown."
+    paper = get_arxiv_abstract(paper_id)
+
+    return {} if paper is None else {"title": paper['title'], "abstract": paper['abstract']}
+
+def get_paper_text(paper_id: str) -> str:
+    """Return the full text of the paper `paper_id` (arXiv ID), loaded from Chroma or from the text store.
+    Returns None if the paper isn't embedded, or if its text is not available."""
+    collection = open_collection(get_chroma_client(os.environ.get('CHROMA_DB_PATH')), "all_" + embedding_system())
+    paper = collection.get(ids=[paper_id + '.pdf'], include=['documents', 'metadatas'])
+
+    if len(paper['ids']) == 0:
+        return None
+
+    metadata = paper['metadatas'][0] or {}
+
+    if paper['documents'][0] is not None and metadata.get('content') != 'abstract':
+        return paper['documents'][0].encode().decode('unicode_escape')
+
+    text = cache_get('text', metadata['text_key']) if 'text_key' in metadata else None
+
+    # the text store is a cache, the text is extracted again if it got deleted
+    if text is None:
+        local_pdf = get_local_pdf(paper_id)
+        text = cached_pdf_to_text(local_pdf) if local_pdf is not None else None
+
+    return text
+
+# %% ../nbs/03_embedding.ipynb 89
+def category_flag(category: str) -> str:
+    "Return the name of the metadata flag of a category"
+    return 'arxiv_' + category
+
+def categories_where(categories: list) -> dict:
+    "Return the `where` filter of the papers of any of the `categories`. Return None for the `all` category."
+    if 'all' in categories:
+        return None
+
+    if len(categories) == 1:
+        return {category_flag(categories[0]): 1}
+
+    return {'$or': [{category_flag(category): 1} for category in categories]}
+
+def papers_metadata(pdf: str, categories: list) -> dict:
+    "Return the metadata of a paper"
+    metadata = {"source": pdf, "category": categories[0], "categories": ' '.join(categories)}
+    metadata.update({category_flag(category): 1 for category in categories})
+
+    return metadata
+
+def add_papers_categories(collection, categories: dict):
+    """Add the `categories`, a dictionary of the list of categories of each paper ID, to the metadata of the papers of `collection`."""
+    existing = collection.get(ids=list(categories.keys()), include=['metadatas'])
+
+    ids, metadatas = [], []
+    for pdf, metadata in zip(existing['ids'], existing['metadatas']):
+        metadata = metadata or {}
+        known = metadata.get('categories', metadata.get('category', '')).split()
+        merged = papers_metadata(pdf, known + [category for category in categories[pdf] if category not in known])
+
+        # papers of previous versions may miss the category flags
+        if any([metadata.get(key) != value for key, value in merged.items()]):
+            metadata.update(merged)
+            ids.append(pdf)
+            metadatas.append(metadata)
+
+    if len(ids) > 0:
+        collection.update(ids=ids, metadatas=metadatas)
+
+def migrate_category_collections(chroma_client):
+    """Merge the per category collections of previous versions into the global collection, and delete them."""
+    papers_all_collection = open_collection(chroma_client, "all_" + embedding_system())
+    suffix = '_' + embedding_system()
+
+    for collection in chroma_client.list_collections():
+        if not collection.name.startswith('arxiv_') or not collection.name.endswith(suffix):
+            continue
+
+        category = collection.name[len('arxiv_'):-len(suffix)]
+        papers = collection.get(include=['embeddings', 'documents'])
+
+        # the papers missing from the global collection are added to it
+        existing = get_existing_ids(papers_all_collection, papers['ids'])
+        missing = [index for index, pdf in enumerate(papers['ids']) if pdf not in existing]
+
+        if len(missing) > 0:
+            papers_all_collection.add(embeddings=[papers['embeddings'][index] for index in missing],
+                                      documents=[papers['documents'][index] for index in missing] if chroma_store_text() and None not in papers['documents'] else None,
+                                      metadatas=[papers_metadata(papers['ids'][index], [category]) for index in missing],
+                                      ids=[papers['ids'][index] for index in missing])
+
+        if len(existing) > 0:
+            add_papers_categories(papers_all_collection, {pdf: [category] for pdf in existing})
+
+        add_paper_categories(papers_all_collection.name, {pdf: [category] for pdf in papers['ids']})
+
+        chroma_client.delete_collection(collection.name)
+        print("[yellow]Collection " + collection.name + " merged into " + papers_all_collection.name + "[/yellow]")
+
+@traced()
+def embed_papers(papers: dict, folder_path: str, workers: int = None) -> bool:
+    """Create the embeddings of the PDF `papers` of `folder_path`, a dictionary of the list of categories of each arXiv ID.
+    Each paper is embedded once, and its categories are recorded in its metadata.
+    The text of the PDF files is extracted by `workers` processes (default: one per CPU).
+    Returns True if successful, False otherwise."""
+
+    if not all([exists(category) for categories in papers.values() for category in categories]):
+        print("[red]Can't persist embeddings in local vector db, ArXiv category not existing[/red]")
+        return False
+
+    chroma_client = get_chroma_client(os.environ.get('CHROMA_DB_PATH'))
+    migrate_category_collections(chroma_client)
+
+    papers_all_collection = open_collection(chroma_client, "all_" + embedding_system())
+    chunks_collection = open_collection(chroma_client, "chunks_" + embedding_system()) if embedding_store_chunks() else None
+
+    with Progress() as progress:
+        pdfs = [id + '.pdf' for id in papers.keys() if os.path.exists(folder_path + id + '.pdf')]
+
+        task = progress.add_task("[cyan]Embedding papers...", total=len(pdfs))
+
+        # check if the PDF file has already been embedded and indexed in Chromadb,
+        # let's not do all this processing if that is the case.
+        new_pdfs = get_new_pdfs(papers_all_collection, pdfs)
+        progress.update(task, advance=len(pdfs) - len(new_pdfs))
+
+        # the categories recorded for the papers, including the ones whose abstract only is embedded
+        recorded = get_paper_categories(papers_all_collection.name, pdfs)
+
+        def paper_categories(pdf: str) -> list:
+            "Categories of a PDF file, followed by the ones already recorded for it."
+            categories = papers[pdf[:-len('.pdf')]]
+            return categories + sorted([category for category in recorded.get(pdf, set()) if category not in categories])
+
+        # the papers already embedded that appear in new categories
+        new = set(new_pdfs)
+        joining = {pdf: [category for category in paper_categories(pdf) if category not in recorded.get(pdf, set())] for pdf in pdfs if pdf not in new}
+        joining = {pdf: categories for pdf, categories in joining.items() if len(categories) > 0}
+
+        if len(joining) > 0:
+            add_papers_categories(papers_all_collection, joining)
+            add_paper_categories(papers_all_collection.name, joining)
+
+        def add_batch(batch: list, keys: list, docs: list):
+            "Embed a batch of papers and add it to all the collections it belongs to."
+
+            # compute the embeddings of the batch, the full texts are in the text store
+            embeddings, chunks = get_embeddings_and_chunks(docs)
+            documents = chroma_documents(docs)
+
+            # stage the writes of the batch for each collection, the embeddings of the abstracts of the papers are replaced
+            writes = [(papers_all_collection.upsert, {"embeddings": embeddings,
+                                                      "documents": documents,
+                                                      "metadatas": [dict(papers_metadata(pdf, paper_categories(pdf)),
+                                                                         content="text",
+                                                                         text_key=key,
+                                                                         **abstract_metadata(pdf[:-len('.pdf')])) for pdf, key in zip(batch, keys)],
+                                                      "ids": batch})]
+
+            if chunks_collection is not None and any(chunks):
+                chunks_write = {"embeddings": [], "metadatas": [], "ids": []}
+
+                for pdf, doc_chunks in zip(batch, chunks):
+                    for index, chunk in enumerate(doc_chunks):
+                        chunks_write["embeddings"].append(chunk)
+                        chunks_write["metadatas"].append({"source": pdf, "chunk": index})
+                        chunks_write["ids"].append(pdf + '#' + str(index))
+
+                writes.append((chunks_collection.add, chunks_write))
+
+            # flush the staged writes, one bulk write per collection
+            for add, write in writes:
+                try:
+                    add(**write)
+                except IDAlreadyExistsError:
+                    print("[yellow]ID already existing in Chroma DB, skipping...[/yellow]")
+
+            # record the embedded papers in the manifest
+            set_embedded_ids(papers_all_collection.name, batch)
+            add_paper_categories(papers_all_collection.name, {pdf: paper_categories(pdf) for pdf in batch})
+
+        # embed the new PDF files in batches as their text get extracted by the worker processes
+        batch_size = embedding_batch_size()
+        batch, keys, docs = [], [], []
+
+        for file_path, key, doc in extract_pdfs_text([folder_path + pdf for pdf in new_pdfs], workers, queue_size=2 * batch_size):
+            if not progress.finished:
+                progress.update(task, advance=1)
+
+            if doc is None:
+                continue
+
+            batch.append(os.path.basename(file_path))
+            keys.append(key)
+            docs.append(doc)
+
+            if len(batch) == batch_size:
+                add_batch(batch, keys, docs)
+                batch, keys, docs = [], [], []
+
+        if len(batch) > 0:
+            add_batch(batch, keys, docs)
+
+    return True
+
+# %% ../nbs/03_embedding.ipynb 91
+@traced()
+def embed_category_abstracts(category: str) -> bool:
+    """Given a ArXiv category, create the embeddings of the title and abstract of each paper of its daily RSS feed.
     Returns True if successful, False otherwise."""
- 
-    chroma_client = chromadb.PersistentClient(path=os.environ.get('CHROMA_DB_PATH'))
+
+    chroma_client = get_chroma_client(os.environ.get('CHROMA_DB_PATH'))
 
     if exists(category):
-        # We create two Chroma collection of embeddings:
-        #   1. a general one with all and every embeddings called 'all'
-        #   2. one for the specific ArXiv category
-        papers_all_collection = chroma_client.get_or_create_collection(name="all_" + embedding_system())
-        papers_category_collection = chroma_client.get_or_create_collection(name="arxiv_" + category + '_' + embedding_system())
+        migrate_category_collections(chroma_client)
+
+        papers_all_collection = open_collection(chroma_client, "all_" + embedding_system())
+
+        papers = get_arxiv_abstracts(category)
+
+        # only embed the papers that are not already existing in Chromadb,
+        # the existing ones are only added to the category
+        existing = get_existing_ids(papers_all_collection, [paper['id'] + '.pdf' for paper in papers])
+        papers = [paper for paper in papers if paper['id'] + '.pdf' not in existing]
+
+        if len(existing) > 0:
+            add_papers_categories(papers_all_collection, {pdf: [category] for pdf in existing})
 
         with Progress() as progress:
-            folder_path = get_docs_path(category)
-            pdfs = get_pdfs_from_folder(folder_path)
+            task = progress.add_task("[cyan]Embedding abstracts...", total=len(papers))
+
+            batch_size = embedding_batch_size()
+
+            for start in range(0, len(papers), batch_size):
+                batch = papers[start:start + batch_size]
+                ids = [paper['id'] + '.pdf' for paper in batch]
+                docs = [paper['title'] + '\n' + paper['abstract'] for paper in batch]
+
+                embeddings = get_embeddings_batch(docs)
 
-            task = progress.add_task("[cyan]Embedding papers...", total=len(pdfs))
+                papers_all_collection.add(embeddings=embeddings,
+                                          documents=chroma_documents(docs),
+                                          metadatas=[dict(papers_metadata(paper['id'] + '.pdf', [category]), content="abstract", title=paper['title'], abstract=paper['abstract']) for paper in batch],
+                                          ids=ids)
 
-            for pdf in pdfs:
-                # check if the PDF file has already been embedded and indexed in Chromadb,
-                # let's not do all this processing if that is the case.
-                check_pdf = papers_all_collection.get(ids=[pdf])
+                # record the embedded papers in the manifest, such that they get embedded again from their PDF file
+                set_embedded_ids(papers_all_collection.name, ids, 'abstract')
+                add_paper_categories(papers_all_collection.name, {id: [category] for id in ids})
 
                 if not progress.finished:
-                    progress.update(task, advance=1)
-
-                if len(check_pdf['ids']) == 0:
-                    doc = pdf_to_text(folder_path.rstrip('/') + '/' + pdf)
-
-                    try:
-                        papers_all_collection.add(
-                            embeddings=get_embeddings(doc),
-                            documents=[doc.encode("unicode_escape").decode()], # necessary escape to prevent possible encoding errors when adding to Chroma
-                            metadatas=[{"source": pdf,
-                                        "category": category}],
-                            ids=[pdf]
-                        )
-                    except IDAlreadyExistsError:
-                        print("[yellow]ID already existing in Chroma DB, skipping...[/yellow]")
-                        continue
-                        
-                    try:
-                        papers_category_collection.add(
-                            embeddings=get_embeddings(doc),
-                            documents=[doc.encode("unicode_escape").decode()], # necessary escape to prevent possible encoding errors when adding to Chroma
-                            metadatas=[{"source": pdf}],
-                            ids=[pdf]
-                        )
-                    except IDAlreadyExistsError:
-                        print("[yellow]ID already existing in Chroma DB, skipping...[/yellow]")
-                        continue
+                    progress.update(task, advance=len(batch))
         return True
     else:
         print("[red]Can't persist embeddings in local vector db, ArXiv category not existing[/red]")
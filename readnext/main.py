@@ -1,20 +1,18 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/00_main.ipynb.
 
 # %% auto 0
-__all__ = ['app', 'version', 'config', 'arxiv_top_categories', 'arxiv_sub_categories', 'personalized_papers', 'config_exists',
-           'config_check_one_exists', 'get_embeddings_dimensions', 'init']
+__all__ = ['app', 'callback', 'version', 'config', 'arxiv_top_categories', 'arxiv_sub_categories', 'personalized_papers', 'sync',
+           'index', 'gc', 'serve', 'benchmark', 'config_exists', 'config_check_one_exists', 'get_embeddings_dimensions',
+           'check_config', 'init']
 
 # %% ../nbs/00_main.ipynb 3
-import arxiv
-import chromadb
 import os
 import typer
+from typing import List
 from dotenv import load_dotenv
 from . import __version__
 from .arxiv_categories import exists, main, sub
-from .arxiv_sync import sync_arxiv
-from .embedding import embed_category_papers, download_embedding_model, embedding_system
-from .personalize import get_personalized_papers, save_personalized_papers_in_zotero
+from .server import forward
 from rich import print
 from typing_extensions import Annotated
 
@@ -22,12 +20,35 @@ from typing_extensions import Annotated
 app = typer.Typer()
 
 # %% ../nbs/00_main.ipynb 7
+@app.callback()
+def callback(ctx: typer.Context,
+             profile: Annotated[str,
+                                typer.Option("--profile",
+                                             help="Trace the command, save the trace in this file (Chrome trace format), and print its summary.")] = None):
+    """Personalized arXiv papers recommendations, based on your Zotero collections."""
+
+    if profile is None:
+        return
+
+    from readnext.tracing import start_tracing, stop_tracing, write_trace, print_summary
+
+    start_tracing()
+
+    def report():
+        tracer = stop_tracing()
+        write_trace(tracer, profile, ctx.invoked_subcommand)
+        print_summary(tracer)
+        print(f"[green]Trace saved in {profile}[/green]")
+
+    ctx.call_on_close(report)
+
+# %% ../nbs/00_main.ipynb 9
 @app.command()
 def version():
     """Get the current installed version of ReadNext"""
     print(f"Version: {__version__}")
 
-# %% ../nbs/00_main.ipynb 10
+# %% ../nbs/00_main.ipynb 12
 @app.command()
 def config():
     """Get the current configuration of ReadNext"""
@@ -41,19 +62,19 @@ def config():
     print(f"ZOTERO_LIBRARY_ID: {os.environ.get('ZOTERO_LIBRARY_ID')}")
     print(f"COHERE_API_KEY: {os.environ.get('COHERE_API_KEY')}")
 
-# %% ../nbs/00_main.ipynb 13
+# %% ../nbs/00_main.ipynb 15
 @app.command()
 def arxiv_top_categories():
     "Display ArXiv main categories. Keys are case sensitive."
     print(main)
 
-# %% ../nbs/00_main.ipynb 16
+# %% ../nbs/00_main.ipynb 18
 @app.command()
 def arxiv_sub_categories():
     "Display ArXiv sub categories. Keys are case sensitive."
     print(sub)
 
-# %% ../nbs/00_main.ipynb 19
+# %% ../nbs/00_main.ipynb 21
 @app.command()
 def personalized_papers(category: str, 
                         focus_collection: str, 
@@ -64,26 +85,61 @@ def personalized_papers(category: str,
                                                   typer.Option("--with-artifacts", 
                                                                "-a",
                                                                help="Add paper artifacts (PDFs & summary files) to Zotero when saving.")] = False,                                                               
-                        nb_proposals=10):
+                        nb_proposals=10,
+                        workers: Annotated[int, 
+                                           typer.Option("--workers",
+                                                        "-w",
+                                                        help="Number of processes used to extract the text of the PDF files. Defaults to the number of CPUs.")] = None,
+                        abstract_only: Annotated[bool,
+                                                 typer.Option("--abstract-only",
+                                                              help="Only embed the title and abstract of the new papers. Only the PDF files of the proposed papers are downloaded.")] = False):
     """Get personalized papers of a `focus-collection` from an ArXiv `category`. 
     If the category is `all` then all categories that have been locally synced will be used.
     if --proposals-collection is set, then the papers will be uploaded to the 
     that Zotero collection, otherwise it will only be displayed to the command line.
     """
 
-    # Step 1: Make sure the category exists
-    if exists(category):
-        # Step 2: get today's list of papers from arXiv
-        print("[green]Syncing today's ArXiv latest papers...[/green]")
-        sync_arxiv(category)
+    # run the command on the server, if it is running
+    if forward('personalized-papers', locals()):
+        return
 
-        # Step 3: create embeddings for each of those new papers
-        print("[green]Creating embeddings for each new paper...[/green]")
-        embed_category_papers(category)
+    from readnext.arxiv_sync import sync_arxiv_categories, download_pdfs, get_store_path, get_arxiv_metadata
+    from readnext.embedding import embed_papers, embed_category_abstracts
+    from readnext.manifest import keep_papers
+    from readnext.personalize import get_personalized_papers, save_personalized_papers_in_zotero
+    from readnext.retention import gc_auto
+
+    check_config()
+
+    categories = category.split(',')
+
+    # Step 1: Make sure the categories exist
+    if all([exists(category) for category in categories]):
+        if abstract_only:
+            # Step 2 & 3: create embeddings for the title and abstract of each of today's new papers
+            print("[green]Creating embeddings for the abstract of each new paper...[/green]")
+            for category in [category for category in categories if category != 'all']:
+                embed_category_abstracts(category)
+        else:
+            # Step 2: get today's list of papers from arXiv
+            print("[green]Syncing today's ArXiv latest papers...[/green]")
+            papers = sync_arxiv_categories(categories)
+
+            # Step 3: create embeddings for each of those new papers
+            print("[green]Creating embeddings for each new paper...[/green]")
+            embed_papers(papers, get_store_path(), workers)
 
         # Step 4: get personalized papers
         print("[green]Get personalized papers...[/green]")
-        ids = get_personalized_papers(category, focus_collection, nb_proposals)
+        ids = get_personalized_papers(','.join(categories), focus_collection, nb_proposals)
+
+        # the recommended papers are kept by the retention policy
+        keep_papers(list(ids.keys()), 'recommended')
+
+        if abstract_only:
+            # only download the PDF files of the proposed papers
+            print("[green]Downloading the proposed papers...[/green]")
+            download_pdfs(get_store_path(), ['http://arxiv.org/abs/' + id for id in ids.keys()])
 
         # Step 5: save personalized papers in Zotero
         if proposals_collection != "":
@@ -91,16 +147,196 @@ def personalized_papers(category: str,
             save_personalized_papers_in_zotero(ids, proposals_collection, with_artifacts)
 
         # Step 6: display personalized papers to the command line
-        search = arxiv.Search(id_list=ids.keys())
+        papers = get_arxiv_metadata(list(ids.keys()))
 
-        for index, result in enumerate(search.results()):
-            print(str(index + 1) + '. [italic yellow][' + list(ids.values())[index] + '][/italic yellow]  [blue][link=' + str(result) + ']' + result.title + '[/link][/blue]')
+        for index, (id, distance) in enumerate(ids.items()):
+            if id in papers:
+                print(str(index + 1) + '. [italic yellow][' + distance + '][/italic yellow]  [blue][link=' + papers[id]['entry_id'] + ']' + papers[id]['title'] + '[/link][/blue]')
+
+        if gc_auto():
+            gc()
     else:
         print("[bold red]Error:[/bold red] [italic red]ArXiv category, or sub-category ID non existing.[/italic red] Please specify a valid category ID.")
 
+# %% ../nbs/00_main.ipynb 23
+@app.command()
+def sync(categories: List[str],
+         workers: Annotated[int,
+                            typer.Option("--workers",
+                                         "-w",
+                                         help="Number of processes used to extract the text of the PDF files. Defaults to the number of CPUs.")] = None):
+    """Synchronize, and embed, the latest papers of one or more ArXiv `categories`.
+    Papers cross-listed in multiple categories are downloaded and embedded only once.
+    """
 
+    # run the command on the server, if it is running
+    if forward('sync', locals()):
+        return
 
-# %% ../nbs/00_main.ipynb 21
+    from readnext.arxiv_sync import sync_arxiv_categories, get_store_path
+    from readnext.embedding import embed_papers
+    from readnext.retention import gc_auto
+
+    check_config(zotero=False)
+
+    if all([exists(category) for category in categories]):
+        print("[green]Syncing today's ArXiv latest papers...[/green]")
+        papers = sync_arxiv_categories(categories)
+
+        print("[green]Creating embeddings for each new paper...[/green]")
+        embed_papers(papers, get_store_path(), workers)
+
+        if gc_auto():
+            gc()
+    else:
+        print("[bold red]Error:[/bold red] [italic red]ArXiv category, or sub-category ID non existing.[/italic red] Please specify valid category IDs.")
+
+# %% ../nbs/00_main.ipynb 25
+@app.command()
+def index(collection: Annotated[str,
+                                typer.Option("--collection",
+                                             "-c",
+                                             help="Name of the Chroma collection. Defaults to the collection of the papers.")] = None,
+          sample: Annotated[int,
+                            typer.Option("--sample",
+                                         help="Number of embeddings used to measure the recall of the index.")] = 100,
+          k: Annotated[int,
+                       typer.Option("--k",
+                                    "-k",
+                                    help="Number of nearest neighbours used to measure the recall of the index.")] = 10,
+          rebuild: Annotated[bool,
+                             typer.Option("--rebuild",
+                                          help="Rebuild the collection with the configured HNSW parameters.")] = False):
+    """Report the size, and the recall, of the HNSW index of a Chroma `collection`.
+    With `--rebuild`, the collection is rebuilt with the configured HNSW parameters first.
+    The text of the papers saved in the collection is dropped by the rebuild, unless `CHROMA_STORE_TEXT` is `true`.
+    """
+
+    # run the command on the server, if it is running
+    if forward('index', locals()):
+        return
+
+    from readnext.embedding import embedding_system, chroma_store_text
+    from readnext.manifest import clear_tombstones
+    from readnext.vector_index import get_chroma_client, index_stats, index_recall, rebuild_collection
+
+    config_exists('DOCS_PATH')
+
+    chroma_client = get_chroma_client(os.environ.get('CHROMA_DB_PATH'))
+    name = collection if collection else 'all_' + embedding_system()
+
+    if name not in [existing.name for existing in chroma_client.list_collections()]:
+        print("[bold red]Error:[/bold red] [italic red]Chroma collection non existing:[/italic red] " + name)
+        return
+
+    if rebuild:
+        print("[green]Rebuilding the collection " + name + "...[/green]")
+        rebuild_collection(chroma_client, name, documents=chroma_store_text())
+        clear_tombstones(name)
+
+    papers_collection = chroma_client.get_collection(name=name)
+
+    for key, value in index_stats(papers_collection).items():
+        print(f"{key.removeprefix('hnsw:')}: {value}")
+
+    recall = index_recall(papers_collection, sample, k)
+
+    if recall is not None:
+        print(f"recall@{k}: {recall:.3f}")
+
+# %% ../nbs/00_main.ipynb 27
+@app.command()
+def gc(dry_run: Annotated[bool,
+                          typer.Option("--dry-run",
+                                       help="Only report what would be deleted.")] = False,
+       compact: Annotated[bool,
+                          typer.Option("--compact",
+                                       help="Rebuild all the collections that have deleted embeddings, whatever their ratio.")] = False):
+    """Delete the papers, and their embeddings, that expired according to the retention policy, and compact the store.
+    """
+
+    # run the command on the server, if it is running
+    if forward('gc', locals()):
+        return
+
+    from readnext.retention import gc_papers, gc_max_age_days, gc_max_bytes
+
+    config_exists('DOCS_PATH')
+
+    if gc_max_age_days() is None and gc_max_bytes() is None and not compact:
+        print("[yellow]No retention policy configured, set [bold]GC_MAX_AGE_DAYS[/bold] and/or [bold]GC_MAX_BYTES[/bold].[/yellow]")
+        return
+
+    summary = gc_papers(dry_run, compact)
+
+    print(("[green]Would delete" if dry_run else "[green]Deleted") + f" {summary['files']} files ({summary['bytes'] / 1024 ** 2:.1f} MB), the embeddings of {summary['papers']} papers, and {summary['cache_entries']} expired cache entries.[/green]")
+
+# %% ../nbs/00_main.ipynb 29
+@app.command()
+def serve(host: Annotated[str,
+                          typer.Option("--host",
+                                       help="Address the server listens on. Defaults to SERVER_HOST, or 127.0.0.1.")] = None,
+          port: Annotated[int,
+                          typer.Option("--port",
+                                       help="Port the server listens on. Defaults to SERVER_PORT, or 8341.")] = None):
+    """Run ReadNext as a resident server that keeps the embedding model, and the Chroma and Zotero clients, in memory.
+    The `personalized-papers`, `sync`, `index` and `gc` commands are forwarded to it while it is running.
+    """
+
+    from readnext.server import run_server
+
+    check_config()
+
+    run_server({'personalized-papers': personalized_papers, 'sync': sync, 'index': index, 'gc': gc}, host, port)
+
+# %% ../nbs/00_main.ipynb 31
+@app.command()
+def benchmark(papers: Annotated[List[int],
+                                typer.Option("--papers",
+                                             help="Number of papers of a synthetic corpus. Can be repeated, defaults to 100, 1000 and 10000.")] = None,
+              output: Annotated[str,
+                                typer.Option("--output",
+                                             help="Save the results in this JSON file.")] = None,
+              compare: Annotated[str,
+                                 typer.Option("--compare",
+                                              help="Compare the results with the baseline saved in this JSON file.")] = None,
+              tolerance: Annotated[float,
+                                   typer.Option("--tolerance",
+                                                help="Relative change of a metric beyond which a stage regressed.")] = 0.2):
+    """Benchmark each stage of the pipeline on synthetic corpora of papers, and compare the results with a baseline.
+    """
+
+    import json
+    from readnext.benchmark import run_benchmarks, compare_benchmarks
+    from readnext.embedding import download_embedding_model
+
+    config_exists('MODELS_PATH')
+    download_embedding_model(os.environ.get('MODELS_PATH'), 'BAAI/bge-base-en')
+
+    results = run_benchmarks(papers or [100, 1000, 10000], os.environ.get('MODELS_PATH'))
+
+    for n, run in results['runs'].items():
+        print(f"\n[bold]{n} papers[/bold] (peak RSS: {run['peak_rss_mb']} MB)")
+        for stage, result in run['stages'].items():
+            print(f"  {stage:<18} {str(result['papers_per_second']):>10} papers/s   p50 {result['p50_ms']:>10} ms   p95 {result['p95_ms']:>10} ms")
+
+    if output is not None:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if compare is not None:
+        with open(compare) as baseline_file:
+            regressions = compare_benchmarks(json.load(baseline_file), results, tolerance)
+
+        for regression in regressions:
+            print(f"[bold red]Regression:[/bold red] {regression['stage']} ({regression['papers']} papers), {regression['metric']} went from {regression['baseline']} to {regression['current']} ({regression['change']:+.0%})")
+
+        if regressions:
+            raise typer.Exit(code=1)
+
+        print("[green]No regression against the baseline.[/green]")
+
+# %% ../nbs/00_main.ipynb 33
 def config_exists(env_var: str):
     """Check if `env_var` environment variable exists"""
     v = env_var.upper()
@@ -114,21 +350,22 @@ def config_check_one_exists(env_vars: list):
             return True
     print("[bold red]Error:[/bold red] [italic red]Configuration option not set.[/italic red] [yellow]Please set one of those [bold]" + repr(env_vars) + "[/bold] environment variables.[/yellow]\n")
 
-# %% ../nbs/00_main.ipynb 23
+# %% ../nbs/00_main.ipynb 35
 def get_embeddings_dimensions(chroma_client, category: str):
     """Get the embedding dimensions of the given `category`"""
     return len(chroma_client.get_collection(category).peek(1)['embeddings'][0])
 
-# %% ../nbs/00_main.ipynb 24
-def init():
-    """Initialize the application"""
-    # load environment variables
-    load_dotenv()
+# %% ../nbs/00_main.ipynb 36
+def check_config(zotero: bool = True):
+    """Check the configuration options needed to embed, and propose, papers, and download the
+    local embedding model if not already downloaded. The Zotero options are only checked if `zotero` is True."""
+    from readnext.embedding import download_embedding_model, embedding_system
 
     # check for the existance of all configuration options
-    config_exists('ZOTERO_API_KEY')
-    config_exists('ZOTERO_LIBRARY_TYPE')
-    config_exists('ZOTERO_LIBRARY_ID')
+    if zotero:
+        config_exists('ZOTERO_API_KEY')
+        config_exists('ZOTERO_LIBRARY_TYPE')
+        config_exists('ZOTERO_LIBRARY_ID')
     config_exists('EMBEDDING_SYSTEM')
     config_exists('DOCS_PATH')
     config_exists('RECOMMENDATIONS_PATH')
@@ -144,10 +381,15 @@ def init():
         case other:
             print("[bold red]Error:[/bold red] [italic red]Configuration option not set.[/italic red] [yellow]Please set the [bold]EMBEDDING_SYSTEM[/bold] environment variable to either [bold]BAAI/bge-base-en[/bold] or [bold]cohere[/bold].[/yellow]\n")            
 
+def init():
+    """Initialize the application"""
+    # load environment variables
+    load_dotenv()
+
     # run app after initialization
     app()
 
-# %% ../nbs/00_main.ipynb 26
+# %% ../nbs/00_main.ipynb 44
 #| eval: false
 if __name__ == "__main__":
     init()
@@ -0,0 +1,185 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/06_manifest.ipynb.
+
+# %% auto 0
+__all__ = ['get_manifest_path', 'manifest_key', 'get_manifest_db', 'manifest_transaction', 'set_file_validation',
+           'remove_file_validation', 'get_validated_files', 'get_embedded_ids', 'set_embedded_ids',
+           'clear_embedded_ids', 'get_embedded_before', 'remove_embedded_ids', 'get_paper_categories',
+           'add_paper_categories', 'keep_papers', 'get_kept_papers', 'add_tombstones', 'get_tombstones',
+           'clear_tombstones']
+
+# %% ../nbs/06_manifest.ipynb 3
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from functools import cache
+
+# %% ../nbs/06_manifest.ipynb 5
+def get_manifest_path() -> str:
+    "Generate the path of the manifest database from the `DOCS_PATH`"
+    return os.environ.get('DOCS_PATH').rstrip('/') + '/manifest.sqlite'
+
+def manifest_key(file_path: str) -> str:
+    "Return the key of a file in the manifest: its path relative to the `DOCS_PATH`"
+    return os.path.relpath(file_path, os.environ.get('DOCS_PATH'))
+
+# %% ../nbs/06_manifest.ipynb 7
+@cache
+def get_manifest_db(path: str) -> sqlite3.Connection:
+    """Open, and create if needed, the manifest database at `path`"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, valid INTEGER, validated_at REAL)")
+    db.execute("CREATE TABLE IF NOT EXISTS embeddings (collection TEXT, id TEXT, embedded_at REAL, source TEXT, PRIMARY KEY (collection, id))")
+    db.execute("CREATE TABLE IF NOT EXISTS categories (collection TEXT, id TEXT, category TEXT, PRIMARY KEY (collection, id, category))")
+    db.execute("CREATE TABLE IF NOT EXISTS kept (id TEXT PRIMARY KEY, reason TEXT, kept_at REAL)")
+    db.execute("CREATE TABLE IF NOT EXISTS tombstones (collection TEXT PRIMARY KEY, count INTEGER)")
+
+    # migrate the manifests created without the source of the embeddings, which is then unknown
+    if 'source' not in [column[1] for column in db.execute("PRAGMA table_info(embeddings)")]:
+        with manifest_transaction(db):
+            db.execute("ALTER TABLE embeddings ADD COLUMN source TEXT")
+
+    return db
+
+# the connections are shared by the threads, their writers are serialized
+_manifest_writer = threading.Lock()
+
+@contextlib.contextmanager
+def manifest_transaction(db: sqlite3.Connection):
+    """Run the writes of the context on the manifest connection `db` in a single transaction, rolled back if they fail.
+    The transactions of the threads are serialized."""
+    with _manifest_writer:
+        db.execute("BEGIN")
+
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        db.execute("COMMIT")
+
+# %% ../nbs/06_manifest.ipynb 9
+def set_file_validation(file_path: str, valid: bool):
+    """Record the outcome of the validation of `file_path` in the manifest."""
+    stat = os.stat(file_path) if os.path.exists(file_path) else None
+
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.execute("INSERT OR REPLACE INTO files (path, size, mtime, valid, validated_at) VALUES (?, ?, ?, ?, ?)",
+                   (manifest_key(file_path),
+                    stat.st_size if stat else None,
+                    stat.st_mtime_ns if stat else None,
+                    int(valid),
+                    time.time()))
+
+def remove_file_validation(file_path: str):
+    """Remove `file_path` from the manifest."""
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.execute("DELETE FROM files WHERE path = ?", (manifest_key(file_path),))
+
+def get_validated_files(folder_path: str) -> set:
+    """Return the name of the files of `folder_path` that have been validated, and that didn't change since."""
+    prefix = manifest_key(folder_path).rstrip('/') + '/'
+
+    rows = get_manifest_db(get_manifest_path()).execute("SELECT path, size, mtime FROM files WHERE valid = 1 AND substr(path, 1, ?) = ?", (len(prefix), prefix))
+
+    validated = set()
+    for path, size, mtime in rows:
+        name = path[len(prefix):]
+        try:
+            stat = os.stat(folder_path.rstrip('/') + '/' + name)
+        except OSError:
+            continue
+
+        if stat.st_size == size and stat.st_mtime_ns == mtime:
+            validated.add(name)
+
+    return validated
+
+# %% ../nbs/06_manifest.ipynb 14
+def get_embedded_ids(collection: str, source: str = None) -> set:
+    """Return the IDs of the papers that have been embedded in `collection`, only the ones embedded from `source` if specified."""
+    if source is None:
+        rows = get_manifest_db(get_manifest_path()).execute("SELECT id FROM embeddings WHERE collection = ?", (collection,))
+    else:
+        rows = get_manifest_db(get_manifest_path()).execute("SELECT id FROM embeddings WHERE collection = ? AND source = ?", (collection, source))
+
+    return {row[0] for row in rows}
+
+def set_embedded_ids(collection: str, ids: list, source: str = 'pdf'):
+    """Record that the papers `ids` have been embedded in `collection`, from their `source` (`pdf` or `abstract`)."""
+    now = time.time()
+
+    # a single transaction for all the IDs
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.executemany("INSERT OR REPLACE INTO embeddings (collection, id, embedded_at, source) VALUES (?, ?, ?, ?)", [(collection, id, now, source) for id in ids])
+
+def clear_embedded_ids(collection: str):
+    """Forget all the papers embedded in `collection`."""
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.execute("DELETE FROM embeddings WHERE collection = ?", (collection,))
+
+def get_embedded_before(collection: str, timestamp: float) -> set:
+    """Return the IDs of the papers that have been embedded in `collection` before `timestamp`."""
+    rows = get_manifest_db(get_manifest_path()).execute("SELECT id FROM embeddings WHERE collection = ? AND embedded_at < ?", (collection, timestamp))
+
+    return {row[0] for row in rows}
+
+def remove_embedded_ids(collection: str, ids: list):
+    """Forget the papers `ids` embedded in `collection`, along with their categories."""
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.executemany("DELETE FROM embeddings WHERE collection = ? AND id = ?", [(collection, id) for id in ids])
+        db.executemany("DELETE FROM categories WHERE collection = ? AND id = ?", [(collection, id) for id in ids])
+
+# %% ../nbs/06_manifest.ipynb 18
+def get_paper_categories(collection: str, ids: list) -> dict:
+    """Return the categories recorded for each of the papers `ids` embedded in `collection`."""
+    ids = set(ids)
+    categories = {}
+
+    for id, category in get_manifest_db(get_manifest_path()).execute("SELECT id, category FROM categories WHERE collection = ?", (collection,)):
+        if id in ids:
+            categories.setdefault(id, set()).add(category)
+
+    return categories
+
+def add_paper_categories(collection: str, categories: dict):
+    """Record the `categories`, a dictionary of the list of categories of each paper ID, of the papers embedded in `collection`."""
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.executemany("INSERT OR IGNORE INTO categories (collection, id, category) VALUES (?, ?, ?)",
+                       [(collection, id, category) for id, paper_categories in categories.items() for category in paper_categories])
+
+# %% ../nbs/06_manifest.ipynb 23
+def keep_papers(ids: list, reason: str):
+    """Record that the papers `ids` (arXiv IDs) have to be kept, for `reason`."""
+    now = time.time()
+
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.executemany("INSERT OR REPLACE INTO kept (id, reason, kept_at) VALUES (?, ?, ?)", [(id, reason, now) for id in ids])
+
+def get_kept_papers() -> set:
+    """Return the arXiv IDs of the papers that have to be kept."""
+    return {row[0] for row in get_manifest_db(get_manifest_path()).execute("SELECT id FROM kept")}
+
+# %% ../nbs/06_manifest.ipynb 25
+def add_tombstones(collection: str, count: int) -> int:
+    """Add `count` embeddings deleted from `collection`. Returns the number of embeddings deleted since its last rebuild."""
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.execute("INSERT INTO tombstones (collection, count) VALUES (?, ?) ON CONFLICT (collection) DO UPDATE SET count = count + excluded.count", (collection, count))
+
+        return db.execute("SELECT count FROM tombstones WHERE collection = ?", (collection,)).fetchone()[0]
+
+def get_tombstones(collection: str) -> int:
+    """Return the number of embeddings deleted from `collection` since its last rebuild."""
+    row = get_manifest_db(get_manifest_path()).execute("SELECT count FROM tombstones WHERE collection = ?", (collection,)).fetchone()
+
+    return 0 if row is None else row[0]
+
+def clear_tombstones(collection: str):
+    """Forget the embeddings deleted from `collection`, once it got rebuilt."""
+    with manifest_transaction(get_manifest_db(get_manifest_path())) as db:
+        db.execute("DELETE FROM tombstones WHERE collection = ?", (collection,))
@@ -1,174 +1,444 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/04_personalize.ipynb.
 
 # %% auto 0
-__all__ = ['get_collection_id_from_name', 'get_target_collection_items', 'create_interests_corpus', 'get_personalized_papers',
-           'get_pdf_summary', 'check_already_in_zotero_proposals', 'save_personalized_papers_in_zotero']
+__all__ = ['get_zotero_client', 'zotero_client', 'get_collections_index', 'get_collection_id_from_name',
+           'get_target_collection_items', 'get_interest_text', 'get_collection_item_versions',
+           'get_interests_embeddings', 'interests_aggregation', 'interests_top_k', 'score_papers', 'chunks_scores',
+           'get_personalized_papers', 'get_pdf_summary', 'get_collection_titles', 'artifacts_concurrency',
+           'artifacts_timeout', 'get_paper_summary', 'get_paper_pdf', 'artifacts_executor', 'save_paper_artifacts',
+           'save_papers_artifacts', 'save_personalized_papers_in_zotero']
 
 # %% ../nbs/04_personalize.ipynb 3
 #| output: false
-import arxiv
-import chromadb
-import cohere
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import numpy as np
 import os
+import shutil
+from functools import cache, lru_cache
 from nameparser import HumanName
 from pyzotero import zotero
 from .arxiv_categories import exists
-from .embedding import pdf_to_text, get_embeddings, embedding_system
+from .arxiv_sync import get_arxiv_metadata, get_local_pdf, download_files, is_valid_pdf
+from .cache import cache_get, cache_set
+from .manifest import keep_papers
+from .tracing import traced
+from .vector_index import open_collection, get_chroma_client, sources_where
+from .embedding import cached_pdf_to_text, get_embeddings_batch, embedding_system, embedding_store_chunks, categories_where, migrate_category_collections, cohere_client, cohere_request
 from rich import print
 from rich.progress import Progress
 
 # %% ../nbs/04_personalize.ipynb 5
+@cache
+def get_zotero_client(library_id: str, library_type: str, api_key: str) -> zotero.Zotero:
+    """Return the Zotero client of a library."""
+    return zotero.Zotero(library_id, library_type, api_key)
+
+def zotero_client() -> zotero.Zotero:
+    """Return the Zotero client of the library configured with `ZOTERO_LIBRARY_ID`, `ZOTERO_LIBRARY_TYPE` and `ZOTERO_API_KEY`"""
+    return get_zotero_client(os.environ.get('ZOTERO_LIBRARY_ID'), os.environ.get('ZOTERO_LIBRARY_TYPE'), os.environ.get('ZOTERO_API_KEY'))
+
+# %% ../nbs/04_personalize.ipynb 7
+@lru_cache(maxsize=8)
+def get_collections_index(zot: zotero.Zotero, library_version: int) -> dict:
+    """Return the ID of all the collections of the library, by their lowercased name.
+       The index is kept in memory for the last few `library_version`."""
+    return {collection['data']['name'].lower(): collection['key'] for collection in zot.everything(zot.collections())}
+
 def get_collection_id_from_name(collection_name: str) -> str:
-    """Return the ID of a collection from its name. 
+    """Return the ID of a collection from its name.
        Return an empty string if no collection's name doesn't exists.
        The comparison is case insensitive."""
-    
-    zot = zotero.Zotero(os.environ.get('ZOTERO_LIBRARY_ID'), os.environ.get('ZOTERO_LIBRARY_TYPE'), os.environ.get('ZOTERO_API_KEY'))
 
-    for collection in zot.collections():
-        if collection['data']['name'].lower() == collection_name.lower():
-            return collection['key']
-        
-    return ''
+    zot = zotero_client()
 
-# %% ../nbs/04_personalize.ipynb 7
+    # the index is built again if the library changed since it has been built
+    index = get_collections_index(zot, zot.last_modified_version())
+
+    return index.get(collection_name.lower(), '')
+
+# %% ../nbs/04_personalize.ipynb 9
 def get_target_collection_items(collection_name: str):
     """Given the name of a Zotero collection, return all the items from that collection."""
     collection = get_collection_id_from_name(collection_name)
 
-    if collection != "":        
-        zot = zotero.Zotero(os.environ.get('ZOTERO_LIBRARY_ID'), os.environ.get('ZOTERO_LIBRARY_TYPE'), os.environ.get('ZOTERO_API_KEY'))
-        return zot.collection_items(collection)
+    if collection != "":
+        zot = zotero_client()
+        return zot.everything(zot.collection_items(collection))
     else:
         return {}
 
-# %% ../nbs/04_personalize.ipynb 9
-def create_interests_corpus(collection_name: str) -> str:
-    """Create a corpus of interests from all the documents
-    existing in a Zotero collection. This corpus will be used to
-    match related daily papers published on ArXiv."""
-    interests_corpus = ""
-
-    for item in get_target_collection_items(collection_name):
-        if item['data']['itemType'] != 'attachment':
-            if 'title' in item['data']:
-                interests_corpus = interests_corpus + ' ' + item['data']['title']
-            if 'abstractNote' in item['data']:
-                interests_corpus = interests_corpus + ' ' + item['data']['abstractNote']
-            interests_corpus = interests_corpus + ' ' + '\n'
-    
-    return interests_corpus
-
 # %% ../nbs/04_personalize.ipynb 11
+def get_interest_text(item: dict) -> str:
+    """Return the text used to embed a Zotero item: its title and its abstract.
+    Return None if the item is not a paper (an attachment or a note)."""
+    if item['data']['itemType'] in ['attachment', 'note']:
+        return None
+
+    text = (item['data'].get('title', '') + '\n' + item['data'].get('abstractNote', '')).strip()
+
+    return text if text != '' else None
+
+# %% ../nbs/04_personalize.ipynb 13
+def get_collection_item_versions(collection_key: str) -> dict:
+    """Return a dictionary of the version of each item of a Zotero collection."""
+    return zotero_client().collection_items(collection_key, format='versions', limit=None)
+
+@traced()
+def get_interests_embeddings(collection_name: str) -> list:
+    """Return the embeddings of each paper of the Zotero collection `collection_name`.
+    An item is embedded only if it changed since its embedding has been cached."""
+    collection_key = get_collection_id_from_name(collection_name)
+
+    if collection_key == '':
+        return []
+
+    def item_cache_key(item_key: str, version: int) -> str:
+        "Local cache key of the embedding of a version of an item."
+        return ':'.join([os.environ.get('ZOTERO_LIBRARY_ID', ''), item_key, str(version), embedding_system()])
+
+    embeddings = []
+    missing = []
+
+    for item_key, version in get_collection_item_versions(collection_key).items():
+        embedding = cache_get('interests', item_cache_key(item_key, version))
+
+        if embedding is None:
+            missing.append(item_key)
+        elif embedding != 'null':
+            embeddings.append(json.loads(embedding))
+
+    if len(missing) > 0:
+        zot = zotero_client()
+
+        # the Zotero API returns up to 50 items per request
+        items = []
+        for start in range(0, len(missing), 50):
+            items.extend(zot.items(itemKey=','.join(missing[start:start + 50]), limit=50))
+
+        texts = {item['key']: get_interest_text(item) for item in items}
+        keys = [key for key, text in texts.items() if text is not None]
+        new_embeddings = dict(zip(keys, get_embeddings_batch([texts[key] for key in keys])))
+
+        for item in items:
+            embedding = new_embeddings.get(item['key'])
+
+            # items that are not papers are cached as well, such that they are not downloaded again
+            cache_set('interests', item_cache_key(item['key'], item['version']), json.dumps(embedding))
+
+            if embedding is not None:
+                embeddings.append(embedding)
+
+    return embeddings
+
+# %% ../nbs/04_personalize.ipynb 18
+def interests_aggregation() -> str:
+    """Return how the similarities with the papers of interest are aggregated, as configured by `INTERESTS_AGGREGATION`"""
+    return os.environ.get('INTERESTS_AGGREGATION', 'max').lower()
+
+def interests_top_k() -> int:
+    """Return the number of papers of interest used by the `top-k` aggregation, as configured by `INTERESTS_TOP_K`"""
+    return max(1, int(os.environ.get('INTERESTS_TOP_K', 3)))
+
+def score_papers(papers_embeddings: list, interests_embeddings: list, aggregation: str = None, k: int = None) -> np.ndarray:
+    """Return the score of each paper: its aggregated cosine similarity with the papers of interest."""
+    aggregation = aggregation if aggregation is not None else interests_aggregation()
+    k = k if k is not None else interests_top_k()
+
+    def normalize(embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    similarities = normalize(papers_embeddings) @ normalize(interests_embeddings).T
+
+    match aggregation:
+        case 'mean':
+            return similarities.mean(axis=1)
+        case 'top-k':
+            k = min(k, similarities.shape[1])
+            return np.partition(similarities, -k, axis=1)[:, -k:].mean(axis=1)
+        case other:
+            return similarities.max(axis=1)
+
+# %% ../nbs/04_personalize.ipynb 22
+def chunks_scores(chunks_collection, pdfs: list, interests_embeddings: list) -> dict:
+    """Return the best score of the chunks of each paper of `pdfs` whose chunks are in `chunks_collection`."""
+    scores = {}
+
+    for start in range(0, len(pdfs), 100):
+        chunks = chunks_collection.get(where=sources_where(pdfs[start:start + 100]), include=['embeddings', 'metadatas'])
+
+        if len(chunks['ids']) == 0:
+            continue
+
+        for metadata, score in zip(chunks['metadatas'], score_papers(chunks['embeddings'], interests_embeddings)):
+            scores[metadata['source']] = max(scores.get(metadata['source'], score), score)
+
+    return scores
+
+@traced()
 def get_personalized_papers(category: str, zotero_collection: str, nb_proposals=10) -> dict:
-    """Given a ArXiv category and a Zotero personalization collection. 
-    Returns a dictionary where the keys are the personalized ArXiv IDs, 
-    and the value the distance to the personalization embedding."""
+    """Given a ArXiv category (or multiple categories separated by commas) and a Zotero personalization collection.
+    Returns a dictionary where the keys are the personalized ArXiv IDs,
+    and the value the distance to the personalization embeddings."""
 
-    chroma_client = chromadb.PersistentClient(path=os.environ.get('CHROMA_DB_PATH'))
+    chroma_client = get_chroma_client(os.environ.get('CHROMA_DB_PATH'))
 
     ids = {}
 
-    if exists(category): 
-        papers_category_collection = chroma_client.get_or_create_collection(name='all' + embedding_system() if category == 'all' else 'arxiv_' + category + '_' + embedding_system())
+    categories = category.split(',')
+
+    if all([exists(category) for category in categories]):
+        migrate_category_collections(chroma_client)
+
+        papers_all_collection = open_collection(chroma_client, 'all_' + embedding_system())
+        where = categories_where(categories)
+
+        interests_embeddings = get_interests_embeddings(zotero_collection)
+
+        if len(interests_embeddings) == 0:
+            return ids
+
+        if papers_all_collection.count() == 0:
+            return ids
+
+        # the candidates are the nearest papers of each paper of interest, in the categories.
+        # Chroma returns all the papers of the categories when there are fewer than `nb_proposals`.
+        interesting_papers = papers_all_collection.query(
+            query_embeddings=interests_embeddings,
+            n_results=int(nb_proposals), # need to force int() to convert when from the command line.
+            where=where,
+            include=['embeddings'])
+
+        candidates = {}
+        for pdfs, embeddings in zip(interesting_papers['ids'], interesting_papers['embeddings']):
+            candidates.update(zip(pdfs, embeddings))
+
+        if len(candidates) == 0:
+            return ids
 
-        interesting_papers = papers_category_collection.query(
-            query_embeddings=get_embeddings(create_interests_corpus(zotero_collection)),
-            n_results=int(nb_proposals)) # need to force int() to convert when from the command line.
+        pdfs = list(candidates.keys())
+        scores = score_papers([candidates[pdf] for pdf in pdfs], interests_embeddings)
 
-        for index, pdf in enumerate(interesting_papers['ids'][0]):
-            ids[pdf.rstrip('.pdf')] = str(interesting_papers['distances'][0][index]) 
+        # a paper is as close to the interests as its closest chunk
+        if embedding_store_chunks():
+            best_chunks = chunks_scores(open_collection(chroma_client, 'chunks_' + embedding_system()), pdfs, interests_embeddings)
+            scores = np.array([max(score, best_chunks.get(pdf, score)) for pdf, score in zip(pdfs, scores)])
+
+        for index in np.argsort(-scores)[:int(nb_proposals)]:
+            ids[pdfs[index].removesuffix('.pdf')] = str(1 - scores[index])
 
     return ids
 
-# %% ../nbs/04_personalize.ipynb 13
+# %% ../nbs/04_personalize.ipynb 27
+@traced()
 def get_pdf_summary(pdf) -> str:
-    text = pdf_to_text(pdf)
-
-    co = cohere.Client(os.environ.get('COHERE_API_KEY'))
+    text = cached_pdf_to_text(pdf)
 
-    res = co.summarize(text[:100000], length='medium')
+    res = cohere_request(lambda: cohere_client().summarize(text[:100000], length='medium'))
 
     return res.summary
 
-# %% ../nbs/04_personalize.ipynb 15
-def check_already_in_zotero_proposals(title: str, proposals_collection: str) -> bool:
-    """Check if a paper is already in the proposals collection."""
-    for item in get_target_collection_items(proposals_collection):
-        if item['data']['itemType'] != 'attachment':
-            if 'title' in item['data']:
-                if item['data']['title'] == title:
-                    return True
-    
-    return False
-
-# %% ../nbs/04_personalize.ipynb 17
+# %% ../nbs/04_personalize.ipynb 29
+def get_collection_titles(collection_name: str) -> set:
+    """Return the titles of all the papers of a Zotero collection."""
+    collection = get_collection_id_from_name(collection_name)
+
+    if collection == '':
+        return set()
+
+    zot = zotero_client()
+
+    return {item['data']['title'] for item in zot.everything(zot.collection_items_top(collection)) if 'title' in item['data']}
+
+# %% ../nbs/04_personalize.ipynb 33
+def artifacts_concurrency() -> int:
+    """Return the number of papers whose artifacts are saved concurrently, as configured by `ARTIFACTS_CONCURRENCY`"""
+    return max(1, int(os.environ.get('ARTIFACTS_CONCURRENCY', 4)))
+
+def artifacts_timeout() -> float:
+    """Return the timeout, in seconds, of each stage of the artifacts pipeline, as configured by `ARTIFACTS_TIMEOUT`"""
+    return float(os.environ.get('ARTIFACTS_TIMEOUT', 300))
+
+def get_paper_summary(paper_id: str, pdf: str) -> str:
+    """Return the summary of the paper `paper_id`. Summarize its `pdf` file only if it is not cached."""
+    summary = cache_get('summary', paper_id)
+
+    if summary is None:
+        summary = get_pdf_summary(pdf)
+        cache_set('summary', paper_id, summary)
+
+    return summary
+
+def get_paper_pdf(paper: dict, rec_path: str) -> str:
+    """Save the PDF file of `paper` in `rec_path`, and return its path.
+    The PDF file synchronized locally is reused, it is only downloaded if it is missing."""
+    pdf_path = rec_path + paper['short_id'] + '.pdf'
+
+    local_pdf = get_local_pdf(paper['id'])
+
+    if local_pdf is not None:
+        shutil.copyfile(local_pdf, pdf_path)
+    elif not os.path.exists(pdf_path):
+        asyncio.run(download_files([(paper['pdf_url'], pdf_path)], validate=is_valid_pdf))
+
+    return pdf_path
+
+@cache
+def artifacts_executor(name: str, threads: int) -> concurrent.futures.ThreadPoolExecutor:
+    """Return the executor `name` of the stages of the artifacts pipeline, with `threads` threads, shared by all the runs of the process.
+    The abandoned calls keep their thread busy until they return, the threads don't pile up."""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='artifacts-' + name)
+
+@traced()
+def save_paper_artifacts(zot: zotero.Zotero, paper: dict, parentid: str, stages: concurrent.futures.Executor, uploads: concurrent.futures.Executor, timeout: float = None):
+    """Save the artifacts of `paper` in Zotero, as attachments of its `parentid` item.
+    The PDF file and the summary are prepared by the `stages` executor, and uploaded by the `uploads` executor.
+    Each stage has to complete within `timeout` seconds."""
+    timeout = timeout if timeout is not None else artifacts_timeout()
+
+    def stage(executor: concurrent.futures.Executor, function, *args):
+        "Run `function` with `executor`. A stage that times out is abandoned, it is cancelled if it didn't start yet."
+        future = executor.submit(function, *args)
+
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    rec_path = os.environ.get('RECOMMENDATIONS_PATH').rstrip('/') + '/'
+    os.makedirs(rec_path, exist_ok=True)
+
+    pdf_path = stage(stages, get_paper_pdf, paper, rec_path)
+
+    summary = stage(stages, get_paper_summary, paper['id'], pdf_path)
+
+    # create a new text file
+    with open(rec_path + paper['short_id'] + '.txt', 'w') as f:
+        f.write(summary)
+
+    stage(uploads, zot.attachment_both, [[paper['short_id'] + '.pdf', pdf_path],
+                                         ['cohere_summary.txt', rec_path + paper['short_id'] + '.txt']], parentid)
+
+def save_papers_artifacts(zot: zotero.Zotero, papers: list, concurrency: int = None, timeout: float = None, callback=None) -> dict:
+    """Save the artifacts of the `papers`, a list of `(paper, parentid)`, concurrently.
+    Returns a dictionary of the arXiv IDs of the papers to True if their artifacts got saved.
+    `callback(paper, saved)` is called after the artifacts of each paper are processed.
+    The calls of the stages that timed out are abandoned: they keep running in the background, nothing waits for them.
+    The uploads to Zotero are serialized, the Zotero client isn't thread safe."""
+    concurrency = concurrency if concurrency is not None else artifacts_concurrency()
+
+    # a stage that timed out keeps its thread busy, the stages get some spare threads
+    stages = artifacts_executor('stages', 2 * concurrency)
+    uploads = artifacts_executor('uploads', 1)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+
+    saved = {}
+
+    try:
+        futures = {executor.submit(save_paper_artifacts, zot, paper, parentid, stages, uploads, timeout): paper for paper, parentid in papers}
+
+        for future in concurrent.futures.as_completed(futures):
+            paper = futures[future]
+
+            try:
+                future.result()
+                saved[paper['id']] = True
+            except concurrent.futures.TimeoutError:
+                saved[paper['id']] = False
+                print("[yellow]Timeout while saving the artifacts of " + paper['id'] + ", skipping...[/yellow]")
+            except Exception as exc:
+                saved[paper['id']] = False
+                print("[yellow]Could not save the artifacts of " + paper['id'] + ": " + str(exc) + "[/yellow]")
+
+            if callback is not None:
+                callback(paper, saved[paper['id']])
+    finally:
+        # the papers in flight are abandoned, the ones that didn't start are cancelled
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return saved
+
+# %% ../nbs/04_personalize.ipynb 38
+@traced()
 def save_personalized_papers_in_zotero(ids: dict, proposals_collection, with_artifacts: bool):
-    """Get all personalized papers propositions and upload them to the 
+    """Get all personalized papers propositions and upload them to the
     `proposals_collection` Zotero collection.
-    
+
     If `with_artifacts=True`, then all documents artifacts will be
-    uploaded to Zotero as well (namely PDFs and summary documents), 
-    but it will take more space to the Zotero account and will be 
+    uploaded to Zotero as well (namely PDFs and summary documents),
+    but it will take more space to the Zotero account and will be
     slower to process."""
 
-    zot = zotero.Zotero(os.environ.get('ZOTERO_LIBRARY_ID'), os.environ.get('ZOTERO_LIBRARY_TYPE'), os.environ.get('ZOTERO_API_KEY'))
+    zot = zotero_client()
+
+    proposals_collection_id = get_collection_id_from_name(proposals_collection)
+    proposals_titles = get_collection_titles(proposals_collection)
 
-    # get information for each matched articles directly from ArXiv
-    search = arxiv.Search(id_list=ids.keys())
+    # get information for each matched articles from the arXiv metadata cache
+    papers = list(get_arxiv_metadata(list(ids.keys())).values())
 
     with Progress() as progress:
-        task = progress.add_task("[cyan]Uploading papers to Zotero...", total=len(list(search.results())))
+        task = progress.add_task("[cyan]Uploading papers to Zotero...", total=len(papers))
+
+        new_papers = []
+        templates = []
+        created = []
 
-        for index, result in enumerate(search.results()):
+        for paper in papers:
             # skip if the paper is already in the proposals collection
-            if(check_already_in_zotero_proposals(result.title, proposals_collection)):
+            if paper['title'] in proposals_titles:
                 if not progress.finished:
                     progress.update(task, advance=1)
                 continue
 
+            proposals_titles.add(paper['title'])
+
             # build the template for the Zotero item
             template = zot.item_template('preprint')
 
-            template['title'] = result.title
+            template['title'] = paper['title']
 
             creators = []
-            for creator in result.authors:
-                name = HumanName(creator.name)
+            for author in paper['authors']:
+                name = HumanName(author)
                 creators.append({'creatorType': 'author', 'firstName': name.first, 'lastName': name.last})
 
-            template['abstractNote'] = result.summary
+            template['abstractNote'] = paper['summary']
             template['creators'] = creators
-            template['url'] = result.entry_id
-            template['DOI'] = result.doi
+            template['url'] = paper['entry_id']
+            template['DOI'] = paper['doi']
             template['repository'] = 'arXiv'
-            template['archiveID'] = 'arxiv:' + result.get_short_id()
+            template['archiveID'] = 'arxiv:' + paper['short_id']
             template['libraryCatalog'] = 'arXiv.org'
-            template['collections'] = [get_collection_id_from_name(proposals_collection)]
-
-            zot.check_items([template])
-
-            resp = zot.create_items([template])
-
-            if '0' in resp['success']:
-                if(with_artifacts):
-                    parentid = resp['success']['0']
-                    rec_path = os.environ.get('RECOMMENDATIONS_PATH').rstrip('/') + '/';
-
-                    if not os.path.exists(rec_path):
-                        os.makedirs(rec_path)
-
-                    paper = next(arxiv.Search(id_list=[result.get_short_id()]).results())
-                    paper.download_pdf(dirpath=rec_path, filename=result.get_short_id() + '.pdf')
-
-                    # create a new text file
-                    with open(rec_path + result.get_short_id() + '.txt', 'w') as f:
-                        f.write(get_pdf_summary(rec_path + result.get_short_id() + '.pdf'))
-                    
-                    zot.attachment_both([[result.get_short_id() + '.pdf', rec_path + result.get_short_id() + '.pdf'],
-                                        ['cohere_summary.txt', rec_path + result.get_short_id() + '.txt']], parentid)
-            else:
-                print("Could not upload paper to Zotero")
-            
-            if not progress.finished:
-                progress.update(task, advance=1)
+            template['collections'] = [proposals_collection_id]
+
+            new_papers.append(paper)
+            templates.append(template)
+
+        # create the items in batches of 50 items
+        for start in range(0, len(templates), 50):
+            zot.check_items(templates[start:start + 50])
+
+            resp = zot.create_items(templates[start:start + 50])
+
+            for index, paper in enumerate(new_papers[start:start + 50]):
+                if str(index) in resp['success']:
+                    created.append((paper, resp['success'][str(index)]))
+                else:
+                    print("Could not upload paper to Zotero")
+
+                if not progress.finished:
+                    progress.update(task, advance=1)
+
+        # the papers saved in Zotero are kept by the retention policy
+        keep_papers([paper['id'] for paper, parentid in created], 'zotero')
+
+        # save the artifacts of the created papers concurrently
+        if(with_artifacts) and len(created) > 0:
+            artifacts_task = progress.add_task("[cyan]Saving papers artifacts to Zotero...", total=len(created))
+
+            save_papers_artifacts(zot, created, callback=lambda paper, saved: progress.update(artifacts_task, advance=1))
@@ -0,0 +1,236 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/08_retention.ipynb.
+
+# %% auto 0
+__all__ = ['PAPER_CACHE_NAMESPACES', 'gc_max_age_days', 'parse_bytes', 'gc_max_bytes', 'gc_keep_recommended', 'gc_compact_ratio',
+           'gc_auto', 'get_local_papers', 'select_expired_papers', 'delete_papers_embeddings', 'chroma_connection',
+           'vacuum', 'compact_store', 'gc_papers']
+
+# %% ../nbs/08_retention.ipynb 3
+import os
+import re
+import sqlite3
+import time
+from .cache import cache_delete, cache_expire, get_cache_db, get_cache_path
+from .manifest import get_kept_papers, remove_file_validation, get_embedded_before, remove_embedded_ids, add_tombstones, get_tombstones, clear_tombstones, get_manifest_db, get_manifest_path
+from .vector_index import rebuild_collection, get_chroma_client, sources_where
+from rich import print
+
+# %% ../nbs/08_retention.ipynb 5
+def gc_max_age_days() -> float:
+    """Return the maximum age, in days, of the papers, as configured by `GC_MAX_AGE_DAYS`. None if there is no limit."""
+    return float(os.environ.get('GC_MAX_AGE_DAYS')) if os.environ.get('GC_MAX_AGE_DAYS') else None
+
+def parse_bytes(size: str) -> int:
+    """Return the number of bytes of a `size` such as `1024`, `500M` or `10G`"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*', size.upper())
+
+    if match is None:
+        raise ValueError("Invalid size: " + size)
+
+    return int(float(match.group(1)) * 1024 ** ' KMGT'.index(match.group(2) or ' '))
+
+def gc_max_bytes() -> int:
+    """Return the maximum size, in bytes, of the PDF files, as configured by `GC_MAX_BYTES`. None if there is no limit."""
+    return parse_bytes(os.environ.get('GC_MAX_BYTES')) if os.environ.get('GC_MAX_BYTES') else None
+
+def gc_keep_recommended() -> bool:
+    """Return True if the recommended papers are never deleted, as configured by `GC_KEEP_RECOMMENDED`"""
+    return os.environ.get('GC_KEEP_RECOMMENDED', 'true').lower() == 'true'
+
+def gc_compact_ratio() -> float:
+    """Return the ratio of deleted embeddings from which a collection is compacted, as configured by `GC_COMPACT_RATIO`"""
+    return float(os.environ.get('GC_COMPACT_RATIO', 0.1))
+
+def gc_auto() -> bool:
+    """Return True if the retention policy is applied automatically, as configured by `GC_AUTO`"""
+    return os.environ.get('GC_AUTO', 'false').lower() == 'true'
+
+# %% ../nbs/08_retention.ipynb 10
+def get_local_papers(docs_path: str) -> list:
+    """Return the PDF files of the sub-folders of `docs_path`, with their arXiv ID, size, and modification time."""
+    papers = []
+
+    for folder in os.scandir(docs_path):
+        if not folder.is_dir():
+            continue
+
+        for entry in os.scandir(folder.path):
+            if entry.name.endswith('.pdf') and entry.is_file():
+                stat = entry.stat()
+                papers.append({'path': entry.path, 'id': entry.name[:-len('.pdf')], 'size': stat.st_size, 'mtime': stat.st_mtime})
+
+    return papers
+
+def select_expired_papers(papers: list, max_age_days: float = None, max_bytes: int = None, keep: set = set(), now: float = None) -> list:
+    """Return the `papers` older than `max_age_days`, and the oldest papers exceeding `max_bytes`. The papers in `keep` are never returned."""
+    now = now if now is not None else time.time()
+
+    candidates = sorted([paper for paper in papers if paper['id'] not in keep], key=lambda paper: paper['mtime'])
+
+    expired = []
+    if max_age_days is not None:
+        expired = [paper for paper in candidates if now - paper['mtime'] > max_age_days * 86400]
+
+    if max_bytes is not None:
+        total = sum([paper['size'] for paper in papers]) - sum([paper['size'] for paper in expired])
+        paths = {paper['path'] for paper in expired}
+
+        for paper in candidates:
+            if total <= max_bytes:
+                break
+
+            if paper['path'] not in paths:
+                expired.append(paper)
+                total -= paper['size']
+
+    return expired
+
+# %% ../nbs/08_retention.ipynb 15
+def delete_papers_embeddings(chroma_client, pdfs: set, chunk_size: int = 1000) -> dict:
+    """Delete the embeddings of the papers `pdfs` from all the Chroma collections.
+    Returns the number of deleted embeddings, by collection."""
+    deleted = {}
+    pdfs = sorted(pdfs)
+
+    for collection in chroma_client.list_collections():
+        ids = []
+
+        for start in range(0, len(pdfs), chunk_size):
+            batch = pdfs[start:start + chunk_size]
+
+            # the embeddings of the papers have their ID, the chunks have the ID of their paper as source
+            found = collection.get(ids=batch, include=['metadatas'])
+            metadatas = dict(zip(found['ids'], found['metadatas']))
+
+            for where_start in range(0, len(batch), 100):
+                found = collection.get(where=sources_where(batch[where_start:where_start + 100]), include=['metadatas'])
+                metadatas.update(zip(found['ids'], found['metadatas']))
+
+            if len(metadatas) == 0:
+                continue
+
+            text_keys = {metadata['text_key'] for metadata in metadatas.values() if metadata is not None and 'text_key' in metadata}
+
+            collection.delete(ids=list(metadatas.keys()))
+            ids.extend(metadatas.keys())
+
+            if len(text_keys) > 0:
+                cache_delete('text', list(text_keys))
+
+        remove_embedded_ids(collection.name, ids)
+
+        if len(ids) > 0:
+            add_tombstones(collection.name, len(ids))
+
+        deleted[collection.name] = len(ids)
+
+    return deleted
+
+# %% ../nbs/08_retention.ipynb 19
+def chroma_connection(chroma_path: str) -> sqlite3.Connection:
+    """Return a new connection to the SQLite database of the Chroma store at `chroma_path`. None if it doesn't exist.
+    The connection has to be closed by the caller."""
+    path = os.path.join(chroma_path, 'chroma.sqlite3')
+
+    return sqlite3.connect(path, isolation_level=None) if os.path.exists(path) else None
+
+def vacuum(db, name: str, timeout: float = 5.0) -> bool:
+    """Reclaim the free space of the SQLite database of the connection `db`, waiting up to `timeout` seconds for it.
+    Returns False if the database is busy."""
+    if db is None:
+        print("[yellow]The " + name + " database can't be accessed, it isn't compacted.[/yellow]")
+        return False
+
+    busy_timeout = db.execute("PRAGMA busy_timeout").fetchone()[0]
+    db.execute("PRAGMA busy_timeout = " + str(int(timeout * 1000)))
+
+    try:
+        db.execute("VACUUM")
+        return True
+    except sqlite3.OperationalError as exc:
+        print("[yellow]The " + name + " database is busy, it will be compacted by a next run.   [" + str(exc) + "][/yellow]")
+        return False
+    finally:
+        db.execute("PRAGMA busy_timeout = " + str(busy_timeout))
+
+def compact_store(chroma_client, force: bool = False, timeout: float = 5.0, chroma_path: str = None) -> list:
+    """Rebuild the collections with too many deleted embeddings, and vacuum the databases. Returns the names of the rebuilt collections.
+    The Chroma database is the one at `chroma_path`, `CHROMA_DB_PATH` by default."""
+    rebuilt = []
+
+    for collection in chroma_client.list_collections():
+        tombstones = get_tombstones(collection.name)
+
+        if tombstones > 0 and (force or tombstones >= gc_compact_ratio() * max(collection.count(), 1)):
+            rebuild_collection(chroma_client,
+                               collection.name,
+                               {key: value for key, value in (collection.metadata or {}).items() if key.startswith('hnsw:')})
+            clear_tombstones(collection.name)
+            rebuilt.append(collection.name)
+
+    # reclaim the free space of the SQLite databases
+    chroma_db = chroma_connection(chroma_path if chroma_path is not None else os.environ.get('CHROMA_DB_PATH'))
+    try:
+        vacuum(chroma_db, 'Chroma', timeout)
+    finally:
+        if chroma_db is not None:
+            chroma_db.close()
+
+    vacuum(get_cache_db(get_cache_path()), 'cache', timeout)
+    vacuum(get_manifest_db(get_manifest_path()), 'manifest', timeout)
+
+    return rebuilt
+
+# %% ../nbs/08_retention.ipynb 23
+PAPER_CACHE_NAMESPACES = ['abstract', 'arxiv', 'summary']
+
+def gc_papers(dry_run: bool = False, force_compact: bool = False) -> dict:
+    """Apply the retention policy to the local papers, and to their embeddings.
+    Returns the number of deleted files, bytes, embeddings, and expired cache entries."""
+    docs_path = os.environ.get('DOCS_PATH')
+    max_age_days = gc_max_age_days()
+
+    papers = get_local_papers(docs_path) if os.path.exists(docs_path) else []
+    keep = get_kept_papers() if gc_keep_recommended() else set()
+
+    expired = select_expired_papers(papers, max_age_days, gc_max_bytes(), keep)
+    expired_paths = {paper['path'] for paper in expired}
+
+    # a paper may have a PDF file in multiple folders, its embeddings are only deleted with its last file
+    remaining = {paper['id'] + '.pdf' for paper in papers if paper['path'] not in expired_paths}
+    pdfs = {paper['id'] + '.pdf' for paper in expired} - remaining
+
+    chroma_client = get_chroma_client(os.environ.get('CHROMA_DB_PATH'))
+
+    cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+
+    # the old embeddings of the papers that have no PDF file
+    if max_age_days is not None:
+        for collection in chroma_client.list_collections():
+            pdfs.update({pdf for pdf in get_embedded_before(collection.name, cutoff) if pdf not in remaining and pdf[:-len('.pdf')] not in keep})
+
+    summary = {'files': len(expired), 'bytes': sum([paper['size'] for paper in expired]), 'papers': len(pdfs), 'embeddings': 0,
+               'cache_entries': cache_expire(cutoff, PAPER_CACHE_NAMESPACES, dry_run=True) if cutoff is not None else 0}
+
+    if dry_run:
+        return summary
+
+    for paper in expired:
+        os.remove(paper['path'])
+        remove_file_validation(paper['path'])
+
+    if len(pdfs) > 0:
+        summary['embeddings'] = sum(delete_papers_embeddings(chroma_client, pdfs).values())
+
+        # the cached information about the deleted papers
+        for namespace in PAPER_CACHE_NAMESPACES:
+            cache_delete(namespace, [pdf[:-len('.pdf')] for pdf in pdfs])
+
+    # the information cached about the papers, older than the papers
+    if cutoff is not None:
+        summary['cache_entries'] = cache_expire(cutoff, PAPER_CACHE_NAMESPACES)
+
+    if len(pdfs) > 0 or force_compact:
+        compact_store(chroma_client, force_compact)
+
+    return summary
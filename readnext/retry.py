@@ -0,0 +1,12 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/12_retry.ipynb.
+
+# %% auto 0
+__all__ = ['retry_after_seconds']
+
+# %% ../nbs/12_retry.ipynb 3
+def retry_after_seconds(headers) -> float:
+    """Return the number of seconds to wait before retrying from a `Retry-After` header. None if not specified."""
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
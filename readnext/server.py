@@ -0,0 +1,212 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/09_server.ipynb.
+
+# %% auto 0
+__all__ = ['CONFIG_PREFIXES', 'EXIT_STATUS', 'server_host', 'server_port', 'server_forward', 'server_url', 'config_fingerprint',
+           'StreamWriter', 'CommandHandler', 'make_server', 'warm_up', 'run_server', 'server_running', 'forward']
+
+# %% ../nbs/09_server.ipynb 4
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import traceback
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import __version__
+from .tracing import tracing
+from rich import print
+
+# %% ../nbs/09_server.ipynb 6
+def server_host() -> str:
+    """Return the address of the server, as configured by `SERVER_HOST`"""
+    return os.environ.get('SERVER_HOST') or '127.0.0.1'
+
+def server_port() -> int:
+    """Return the port of the server, as configured by `SERVER_PORT`"""
+    return int(os.environ.get('SERVER_PORT') or 8341)
+
+def server_forward() -> bool:
+    """Return True if the commands have to be forwarded to the server when it is running, as configured by `SERVER_FORWARD`"""
+    return os.environ.get('SERVER_FORWARD', 'true').lower() == 'true'
+
+def server_url() -> str:
+    """Return the URL of the server"""
+    return f"http://{server_host()}:{server_port()}"
+
+CONFIG_PREFIXES = ('ARTIFACTS_', 'CHROMA_', 'CO_API_', 'COHERE_', 'DOCS_', 'DOWNLOAD_', 'EMBEDDING_', 'GC_', 'HNSW_',
+                   'INTERESTS_', 'MODELS_', 'PDF_', 'RECOMMENDATIONS_', 'ZOTERO_')
+
+def config_fingerprint() -> str:
+    """Return a fingerprint of the configuration of ReadNext: the environment variables of `CONFIG_PREFIXES` that are set"""
+    config = sorted((name, value) for name, value in os.environ.items() if name.startswith(CONFIG_PREFIXES) and value != '')
+
+    return hashlib.sha256(json.dumps(config).encode('utf-8')).hexdigest()
+
+# %% ../nbs/09_server.ipynb 8
+_serving = False
+
+EXIT_STATUS = '\x00readnext-exit: '
+
+class StreamWriter(io.TextIOBase):
+    "Text stream that writes to the response of a request. The output is dropped once the client disconnected."
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.connected = True
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if self.connected:
+            try:
+                self.wfile.write(text.encode('utf-8'))
+                self.wfile.flush()
+            except OSError:
+                self.connected = False
+
+        return len(text)
+
+class CommandHandler(BaseHTTPRequestHandler):
+    "Run the commands sent to the server, and stream their output back to the client"
+
+    def send_json(self, value: dict):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(value).encode('utf-8'))
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_error(404)
+            return
+
+        self.send_json({'version': __version__, 'pid': os.getpid()})
+
+    def do_POST(self):
+        command = self.server.commands.get(self.path.strip('/'))
+
+        if command is None:
+            self.send_error(404, 'Unknown command')
+            return
+
+        if self.headers.get('X-Readnext-Config') != self.server.config:
+            self.send_error(409, 'Configuration mismatch')
+            return
+
+        arguments = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or '{}')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.end_headers()
+
+        stream = StreamWriter(self.wfile)
+
+        with self.server.lock, contextlib.redirect_stdout(stream):
+            try:
+                command(**arguments)
+                status = 0
+            except SystemExit as exc:
+                status = exc.code if isinstance(exc.code, int) else 1
+            except Exception as exc:
+                # `typer.Exit` carries the exit code of the command
+                status = getattr(exc, 'exit_code', None)
+                if status is None:
+                    traceback.print_exc(file=sys.stdout)
+                    status = 1
+
+        # the exit status of the command is the last line of the output
+        stream.write(EXIT_STATUS + str(status) + '\n')
+
+def make_server(commands: dict, host: str = None, port: int = None) -> ThreadingHTTPServer:
+    """Create the server that runs the `commands` (functions, by name) it receives on `host`:`port`"""
+    server = ThreadingHTTPServer((host or server_host(), server_port() if port is None else port), CommandHandler)
+    server.daemon_threads = True
+    server.commands = commands
+    server.lock = threading.Lock()
+    server.config = config_fingerprint()
+
+    return server
+
+# %% ../nbs/09_server.ipynb 10
+def warm_up():
+    """Load the embedding model, and create the Chroma, Cohere and Zotero clients, used by the commands"""
+    from readnext.embedding import embedding_system, load_configured_embedding_model, cohere_client
+    from readnext.personalize import zotero_client
+    from readnext.vector_index import get_chroma_client
+
+    if embedding_system() == 'baai-bge-base-en':
+        load_configured_embedding_model(os.environ.get('MODELS_PATH'))
+
+    if os.environ.get('COHERE_API_KEY'):
+        cohere_client()
+
+    get_chroma_client(os.environ.get('CHROMA_DB_PATH'))
+
+    if os.environ.get('ZOTERO_API_KEY'):
+        zotero_client()
+
+def run_server(commands: dict, host: str = None, port: int = None):
+    """Load the shared resources, and run the server of the `commands` until it is interrupted"""
+    global _serving
+    _serving = True
+
+    print("[green]Loading the embedding model and the clients...[/green]")
+    warm_up()
+
+    server = make_server(commands, host, port)
+    print(f"[green]ReadNext server listening on http://{server.server_address[0]}:{server.server_address[1]}[/green]")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# %% ../nbs/09_server.ipynb 12
+def server_running(timeout: float = 0.5) -> bool:
+    """Return True if a server of the same version of ReadNext is running"""
+    try:
+        with urllib.request.urlopen(server_url() + '/health', timeout=timeout) as response:
+            return json.load(response).get('version') == __version__
+    except (OSError, ValueError):
+        return False
+
+def forward(command: str, arguments: dict, file=None) -> bool:
+    """Run `command`, with `arguments`, on the server and write its output to `file` (defaults to `stdout`).
+    Returns False if the command has to run locally, which is also the case when it is profiled.
+    Exits with the exit status of the command if it failed on the server."""
+    if _serving or tracing() or not server_forward() or not server_running():
+        return False
+
+    file = file or sys.stdout
+    request = urllib.request.Request(server_url() + '/' + command,
+                                     data=json.dumps(arguments).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json', 'X-Readnext-Config': config_fingerprint()})
+
+    # the server stopped before the command completed if there is no exit status
+    status = 1
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            for line in response:
+                line = line.decode('utf-8')
+                if line.startswith(EXIT_STATUS):
+                    status = int(line[len(EXIT_STATUS):])
+                else:
+                    file.write(line)
+                    file.flush()
+    except urllib.error.HTTPError as exc:
+        if exc.code == 409:
+            print("[yellow]The configuration differs from the one of the server, running the command locally.[/yellow]")
+        return False
+
+    if status != 0:
+        raise SystemExit(status)
+
+    return True
@@ -0,0 +1,248 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/11_tracing.ipynb.
+
+# %% auto 0
+__all__ = ['CLIENT_METHODS', 'peak_rss_mb', 'Tracer', 'tracing', 'current_tid', 'Span', 'span', 'count', 'traced', 'instrument',
+           'instrument_clients', 'start_tracing', 'stop_tracing', 'summarize', 'write_trace', 'print_summary']
+
+# %% ../nbs/11_tracing.ipynb 4
+import asyncio
+import contextlib
+import functools
+import importlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from . import __version__
+from rich import print
+from rich.table import Table
+
+# %% ../nbs/11_tracing.ipynb 6
+def peak_rss_mb() -> float:
+    """Return the peak resident set size of the process, in MB. None if it can't be measured on this platform."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes on macOS, kilobytes on Linux
+    return round(peak / 1024 ** (2 if sys.platform == 'darwin' else 1), 1)
+
+# %% ../nbs/11_tracing.ipynb 8
+class Tracer:
+    "Records the spans, and the counters, of a trace"
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self.pid = os.getpid()
+        self.events = []
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def timestamp(self, moment: float) -> float:
+        """Return the `moment` (a `perf_counter` value) in microseconds since the tracer started"""
+        return round((moment - self.start) * 1e6, 3)
+
+    def record(self, name: str, start: float, end: float, tid: int, args: dict = None):
+        """Record the span `name`, from `start` to `end`, that ran in the thread, or task, `tid`"""
+        peak = peak_rss_mb()
+        span = {'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                'ts': self.timestamp(start), 'dur': round((end - start) * 1e6, 3), 'args': dict(args or {}, peak_rss_mb=peak)}
+
+        with self.lock:
+            self.events.append(span)
+            self.events.append({'name': 'memory', 'ph': 'C', 'pid': self.pid, 'ts': self.timestamp(end), 'args': {'peak_rss_mb': peak}})
+
+    def count(self, name: str, value: int = 1):
+        """Add `value` to the counter `name`"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def spans(self) -> list:
+        """Return the recorded spans"""
+        return [event for event in self.events if event['ph'] == 'X']
+
+# %% ../nbs/11_tracing.ipynb 10
+_tracer = None
+
+_no_span = contextlib.nullcontext()
+
+def tracing() -> bool:
+    """Return True if tracing is on"""
+    return _tracer is not None
+
+def current_tid() -> int:
+    """Return the ID of the current asyncio task, or of the current thread if no task is running"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+
+    return id(task) if task is not None else threading.get_ident()
+
+class Span:
+    "Context manager that records a span in the tracer"
+
+    def __init__(self, tracer: Tracer, name: str, args: dict):
+        self.tracer, self.name, self.args = tracer, name, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter(), current_tid(), self.args)
+
+def span(name: str, **args):
+    """Record the time spent in the `with` block as the span `name`, along with `args`. Does nothing if tracing is off."""
+    if _tracer is None:
+        return _no_span
+
+    return Span(_tracer, name, args)
+
+def count(name: str, value: int = 1):
+    """Add `value` to the counter `name`. Does nothing if tracing is off."""
+    if _tracer is not None:
+        _tracer.count(name, value)
+
+def traced(name: str = None):
+    """Decorator that records each call of a function, or of a coroutine, as a span. The span is named after the function by default."""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return await function(*args, **kwargs)
+
+                with Span(_tracer, span_name, {}):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if _tracer is None:
+                    return function(*args, **kwargs)
+
+                with Span(_tracer, span_name, {}):
+                    return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+# %% ../nbs/11_tracing.ipynb 12
+CLIENT_METHODS = {'chromadb.api.models.Collection.Collection': ('chroma', ['add', 'get', 'query', 'update', 'upsert', 'delete', 'count']),
+                  'pyzotero.zotero.Zotero': ('zotero', ['everything', 'collections', 'collection_items', 'collection_items_top', 'items',
+                                                        'create_items', 'attachment_both', 'last_modified_version'])}
+
+def instrument(cls, methods: list, prefix: str):
+    """Trace the `methods` of the class `cls` as `prefix.method` spans. Returns a function that restores the original methods."""
+    originals = {method: cls.__dict__[method] for method in methods if method in cls.__dict__}
+
+    for method, function in originals.items():
+        setattr(cls, method, traced(prefix + '.' + method)(function))
+
+    def restore():
+        for method, function in originals.items():
+            setattr(cls, method, function)
+
+    return restore
+
+def instrument_clients() -> list:
+    """Instrument the methods of the clients of `CLIENT_METHODS` that can be imported. Returns the functions that restore them."""
+    restores = []
+
+    for path, (prefix, methods) in CLIENT_METHODS.items():
+        module, cls = path.rsplit('.', 1)
+        try:
+            restores.append(instrument(getattr(importlib.import_module(module), cls), methods, prefix))
+        except (ImportError, AttributeError):
+            pass
+
+    return restores
+
+# %% ../nbs/11_tracing.ipynb 14
+_restores = []
+
+def start_tracing(clients: bool = True) -> Tracer:
+    """Start tracing, and instrument the Chroma and Zotero clients if `clients` is True. Returns the tracer."""
+    global _tracer
+
+    if clients:
+        _restores.extend(instrument_clients())
+
+    _tracer = Tracer()
+
+    return _tracer
+
+def stop_tracing() -> Tracer:
+    """Stop tracing, and restore the instrumented clients. Returns the tracer, None if tracing wasn't on."""
+    global _tracer
+
+    tracer, _tracer = _tracer, None
+
+    while _restores:
+        _restores.pop()()
+
+    if tracer is not None:
+        tracer.end = time.perf_counter()
+
+    return tracer
+
+# %% ../nbs/11_tracing.ipynb 16
+def summarize(tracer: Tracer) -> list:
+    """Return the calls, total time, and mean/p95/max durations of each span of the trace, by decreasing total time"""
+    durations = {}
+    for event in tracer.spans():
+        durations.setdefault(event['name'], []).append(event['dur'] / 1000)
+
+    wall = ((tracer.end or time.perf_counter()) - tracer.start) * 1000
+    rows = []
+
+    for name, values in durations.items():
+        values = sorted(values)
+        rows.append({'name': name,
+                     'calls': len(values),
+                     'total_ms': round(sum(values), 3),
+                     'wall_percent': round(100 * sum(values) / wall, 1) if wall > 0 else None,
+                     'mean_ms': round(sum(values) / len(values), 3),
+                     'p95_ms': round(values[min(len(values) - 1, int(0.95 * len(values)))], 3),
+                     'max_ms': round(values[-1], 3)})
+
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+def write_trace(tracer: Tracer, path: str, command: str = None):
+    """Save the trace in the Chrome trace format in `path`, along with its summary, counters and peak memory"""
+    metadata = [{'name': 'process_name', 'ph': 'M', 'pid': tracer.pid, 'args': {'name': 'readnext ' + (command or '')}}]
+
+    with open(path, 'w') as trace_file:
+        json.dump({'traceEvents': metadata + tracer.events,
+                   'displayTimeUnit': 'ms',
+                   'otherData': {'readnext': __version__,
+                                 'command': command,
+                                 'wall_seconds': round((tracer.end or time.perf_counter()) - tracer.start, 3),
+                                 'peak_rss_mb': peak_rss_mb(),
+                                 'counters': tracer.counters,
+                                 'summary': summarize(tracer)}}, trace_file)
+
+def print_summary(tracer: Tracer):
+    """Print the summary of the spans, and the counters, of the trace"""
+    table = Table(title=f"Profile ({(tracer.end or time.perf_counter()) - tracer.start:.2f}s, peak RSS {peak_rss_mb()} MB)")
+
+    for column in ['span', 'calls', 'total (ms)', '% wall', 'mean (ms)', 'p95 (ms)', 'max (ms)']:
+        table.add_column(column, justify='left' if column == 'span' else 'right', overflow='fold')
+
+    for row in summarize(tracer):
+        table.add_row(row['name'], str(row['calls']), f"{row['total_ms']:.1f}", str(row['wall_percent']),
+                      f"{row['mean_ms']:.2f}", f"{row['p95_ms']:.2f}", f"{row['max_ms']:.2f}")
+
+    print(table)
+
+    for name, value in sorted(tracer.counters.items()):
+        print(f"  {name}: {value:,}")
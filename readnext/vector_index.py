@@ -0,0 +1,176 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: ../nbs/07_vector_index.ipynb.
+
+# %% auto 0
+__all__ = ['HNSW_DEFAULTS', 'get_chroma_client', 'sources_where', 'hnsw_metadata', 'recover_rebuild', 'open_collection',
+           'index_parameters', 'index_stats', 'distances', 'brute_force_neighbours', 'index_recall',
+           'rebuild_collection']
+
+# %% ../nbs/07_vector_index.ipynb 3
+import chromadb
+import numpy as np
+import os
+import random
+from functools import cache
+
+# %% ../nbs/07_vector_index.ipynb 5
+@cache
+def get_chroma_client(path: str):
+    """Return the Chroma client of the database saved in `path`. The client is kept in memory for the lifetime of the process."""
+    return chromadb.PersistentClient(path=path)
+
+# %% ../nbs/07_vector_index.ipynb 10
+def sources_where(pdfs: list) -> dict:
+    "Return the `where` filter of the embeddings whose `source` is one of the `pdfs`."
+    if len(pdfs) == 1:
+        return {'source': pdfs[0]}
+
+    return {'$or': [{'source': pdf} for pdf in pdfs]}
+
+# %% ../nbs/07_vector_index.ipynb 14
+HNSW_DEFAULTS = {'hnsw:space': 'l2', 'hnsw:construction_ef': 100, 'hnsw:search_ef': 10, 'hnsw:M': 16}
+
+def hnsw_metadata() -> dict:
+    """Return the HNSW parameters of the new collections, as configured by `HNSW_SPACE`, `HNSW_CONSTRUCTION_EF`, `HNSW_SEARCH_EF` and `HNSW_M`"""
+    metadata = {}
+
+    if os.environ.get('HNSW_SPACE'):
+        metadata['hnsw:space'] = os.environ.get('HNSW_SPACE')
+
+    for parameter in ['construction_ef', 'search_ef', 'M']:
+        if os.environ.get('HNSW_' + parameter.upper()):
+            metadata['hnsw:' + parameter] = int(os.environ.get('HNSW_' + parameter.upper()))
+
+    return metadata
+
+def recover_rebuild(chroma_client, name: str) -> set:
+    """Complete, or roll back, an interrupted rebuild of the collection `name`. Returns the names of the collections."""
+    names = {collection.name for collection in chroma_client.list_collections()}
+    rebuilt_name, backup_name = name + '_rebuild', name + '_backup'
+
+    if name not in names:
+        # the swap got interrupted, once the copy was complete
+        for source in [rebuilt_name, backup_name]:
+            if source in names:
+                chroma_client.get_collection(name=source).modify(name=name)
+                names = (names - {source}) | {name}
+                break
+
+    if name in names:
+        for leftover in [rebuilt_name, backup_name]:
+            if leftover in names:
+                chroma_client.delete_collection(leftover)
+                names.discard(leftover)
+
+    return names
+
+def open_collection(chroma_client, name: str):
+    """Return the Chroma collection `name`. It is created, with the HNSW parameters of `hnsw_metadata`, if it doesn't exist.
+    An interrupted rebuild of the collection is recovered first (see `recover_rebuild`)."""
+    if name in recover_rebuild(chroma_client, name):
+        return chroma_client.get_collection(name=name)
+
+    return chroma_client.create_collection(name=name, metadata=hnsw_metadata() or None)
+
+def index_parameters(collection) -> dict:
+    """Return the HNSW parameters of `collection`"""
+    metadata = collection.metadata or {}
+
+    return {key: metadata.get(key, default) for key, default in HNSW_DEFAULTS.items()}
+
+# %% ../nbs/07_vector_index.ipynb 19
+def index_stats(collection) -> dict:
+    """Return the statistics of the HNSW index of `collection`"""
+    count = collection.count()
+    dimensions = len(collection.peek(1)['embeddings'][0]) if count > 0 else 0
+    parameters = index_parameters(collection)
+
+    return {'name': collection.name,
+            'count': count,
+            'dimensions': dimensions,
+            **parameters,
+            'estimated_size': count * (dimensions * 4 + parameters['hnsw:M'] * 2 * 4)}
+
+# %% ../nbs/07_vector_index.ipynb 21
+def distances(queries: np.ndarray, embeddings: np.ndarray, space: str) -> np.ndarray:
+    """Return the matrix of the distances between the `queries` and the `embeddings`, as computed by the HNSW `space`"""
+    match space:
+        case 'cosine':
+            normalize = lambda vectors: vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            return 1 - normalize(queries) @ normalize(embeddings).T
+        case 'ip':
+            return 1 - queries @ embeddings.T
+        case other:
+            return (queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ embeddings.T + (embeddings ** 2).sum(axis=1)
+
+def brute_force_neighbours(collection, ids: list, queries: np.ndarray, k: int, chunk_size: int = 1000) -> list:
+    """Return the IDs of the exact `k` nearest neighbours of each of the `queries` among the embeddings `ids` of `collection`"""
+    space = index_parameters(collection)['hnsw:space']
+
+    best_distances = np.empty((len(queries), 0), dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=object)
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = collection.get(ids=ids[start:start + chunk_size], include=['embeddings'])
+
+        chunk_distances = distances(queries, np.asarray(chunk['embeddings'], dtype=np.float32), space)
+        chunk_ids = np.broadcast_to(np.array(chunk['ids'], dtype=object), chunk_distances.shape)
+
+        # only keep the k nearest neighbours found so far
+        candidates_distances = np.concatenate([best_distances, chunk_distances], axis=1)
+        candidates_ids = np.concatenate([best_ids, chunk_ids], axis=1)
+        nearest = np.argsort(candidates_distances, axis=1)[:, :k]
+
+        best_distances = np.take_along_axis(candidates_distances, nearest, axis=1)
+        best_ids = np.take_along_axis(candidates_ids, nearest, axis=1)
+
+    return [list(neighbours) for neighbours in best_ids]
+
+def index_recall(collection, sample: int = 100, k: int = 10, seed: int = None) -> float:
+    """Return the recall@`k` of the HNSW index of `collection`, measured on a random `sample` of its embeddings.
+    Returns None if the collection is empty."""
+    ids = collection.get(include=[])['ids']
+
+    if len(ids) == 0:
+        return None
+
+    k = min(k, len(ids))
+    queries = np.asarray(collection.get(ids=random.Random(seed).sample(ids, min(sample, len(ids))), include=['embeddings'])['embeddings'], dtype=np.float32)
+
+    approximate = collection.query(query_embeddings=queries.tolist(), n_results=k, include=['distances'])['ids']
+    exact = brute_force_neighbours(collection, ids, queries, k)
+
+    return float(np.mean([len(set(found) & set(neighbours)) / k for found, neighbours in zip(approximate, exact)]))
+
+# %% ../nbs/07_vector_index.ipynb 26
+def rebuild_collection(chroma_client, name: str, metadata: dict = None, batch_size: int = 1000, documents: bool = True):
+    """Rebuild the collection `name` with the HNSW parameters `metadata` (default: `hnsw_metadata()`). Returns the rebuilt collection.
+    The documents are dropped if `documents` is False."""
+    metadata = metadata if metadata is not None else hnsw_metadata()
+
+    recover_rebuild(chroma_client, name)
+
+    collection = chroma_client.get_collection(name=name)
+    rebuilt_name, backup_name = name + '_rebuild', name + '_backup'
+
+    # keep the other metadata of the collection, only the HNSW parameters change
+    rebuilt_metadata = {key: value for key, value in (collection.metadata or {}).items() if not key.startswith('hnsw:')}
+    rebuilt_metadata.update(metadata)
+
+    rebuilt = chroma_client.create_collection(name=rebuilt_name, metadata=rebuilt_metadata or None)
+
+    ids = collection.get(include=[])['ids']
+
+    for start in range(0, len(ids), batch_size):
+        batch = collection.get(ids=ids[start:start + batch_size], include=['embeddings', 'documents', 'metadatas'] if documents else ['embeddings', 'metadatas'])
+
+        rebuilt.add(embeddings=batch['embeddings'],
+                    documents=batch['documents'] if documents and None not in batch['documents'] else None,
+                    metadatas=batch['metadatas'] if None not in batch['metadatas'] else None,
+                    ids=batch['ids'])
+
+    # swap the collections, the old collection is only deleted once the new one took its name
+    collection.modify(name=backup_name)
+    rebuilt.modify(name=name)
+    chroma_client.delete_collection(backup_name)
+
+    return rebuilt